@@ -0,0 +1,247 @@
+"""
+In-memory prefix index for student name autocomplete
+
+Names are normalized (accents stripped, casefolded, whitespace collapsed) and
+every word start is indexed, so "doe" finds "John Doe". The index is a sorted
+array of (key, student_id) pairs searched with bisect: a lookup costs one
+binary search plus the K matches it returns.
+
+The index is built at startup from one streamed query and kept current from
+the ORM: Student rows flushed by the CRUD functions are staged on the session
+and applied when it commits (dropped on rollback). Bulk statements that
+bypass the unit of work (roster sync, archiving) mark the index stale, and
+the next lookup rebuilds it. Writes made by other worker processes are
+picked up by the periodic rebuild every AUTOCOMPLETE_MAX_AGE seconds.
+"""
+import os
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Optional
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.models import Student
+
+load_dotenv()
+
+AUTOCOMPLETE_MAX_AGE = float(os.getenv("AUTOCOMPLETE_MAX_AGE", "300"))
+
+_STAGED = "name_index_ops"
+_INVALIDATE = "name_index_invalidate"
+_MARKS = "name_index_savepoints"
+
+
+def normalize_name(text: str) -> str:
+    """Accent-free, casefolded name with single spaces"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def _keys(name: str) -> list[str]:
+    """Index keys for a name: the normalized name from each word start on"""
+    words = normalize_name(name).split(" ")
+    return [" ".join(words[start:]) for start in range(len(words)) if words[start]]
+
+
+class NameIndex:
+    """Sorted-array prefix index over active student names"""
+
+    def __init__(self, max_age: float = AUTOCOMPLETE_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._entries: list[tuple[str, int]] = []
+        self._names: dict[int, str] = {}
+        self._built_at = 0.0
+        self._stale = True
+        # Changes committed while a rebuild is streaming, replayed after the swap
+        self._replay: Optional[list[tuple[int, Optional[str]]]] = None
+        self.lookups = 0
+        self.rebuilds = 0
+
+    @property
+    def stale(self) -> bool:
+        """Whether the next lookup should trigger a rebuild"""
+        if self._stale:
+            return True
+        return self.max_age > 0 and time.monotonic() - self._built_at > self.max_age
+
+    def build(self, db: Session) -> None:
+        """Load every active student's name with one streamed query"""
+        with self._build_lock:
+            self._build(db)
+
+    def refresh(self) -> None:
+        """Rebuild in a fresh session unless another rebuild is already running"""
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            db = SessionLocal()
+            try:
+                self._build(db)
+            finally:
+                db.close()
+        finally:
+            self._build_lock.release()
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[int, str]]:
+        """Up to limit (student_id, name) pairs whose name has a word starting with query"""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+
+        matches: list[tuple[int, str]] = []
+        seen: set[int] = set()
+        with self._lock:
+            self.lookups += 1
+            entries = self._entries
+            for position in range(bisect_left(entries, (prefix,)), len(entries)):
+                key, student_id = entries[position]
+                if not key.startswith(prefix):
+                    break
+                if student_id not in seen:
+                    seen.add(student_id)
+                    matches.append((student_id, self._names[student_id]))
+                    if len(matches) == limit:
+                        break
+        return matches
+
+    def apply(self, changes: list[tuple[int, Optional[str]]]) -> None:
+        """Apply committed (student_id, name) changes; a None name removes the student"""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.extend(changes)
+            for student_id, name in changes:
+                self._remove(student_id)
+                if name is not None:
+                    self._names[student_id] = name
+                    for key in _keys(name):
+                        insort(self._entries, (key, student_id))
+
+    def invalidate(self) -> None:
+        """Mark the index out of date; the next lookup rebuilds it"""
+        self._stale = True
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        return {
+            "students": len(self._names),
+            "keys": len(self._entries),
+            "stale": self.stale,
+            "lookups": self.lookups,
+            "rebuilds": self.rebuilds
+        }
+
+    def _remove(self, student_id: int) -> None:
+        name = self._names.pop(student_id, None)
+        if name is None:
+            return
+        for key in _keys(name):
+            position = bisect_left(self._entries, (key, student_id))
+            if position < len(self._entries) and self._entries[position] == (key, student_id):
+                del self._entries[position]
+
+    def _build(self, db: Session) -> None:
+        self._stale = False
+        with self._lock:
+            self._replay = []
+        try:
+            names: dict[int, str] = {}
+            entries: list[tuple[str, int]] = []
+            rows = db.execute(
+                select(Student.student_id, Student.name)
+                .where(Student.deleted_at.is_(None))
+                .execution_options(yield_per=10000)
+            )
+            for student_id, name in rows:
+                names[student_id] = name
+                entries.extend((key, student_id) for key in _keys(name))
+            entries.sort()
+
+            with self._lock:
+                replay, self._replay = self._replay, None
+                self._entries, self._names = entries, names
+            # Commits that raced the streamed query; applying them again is harmless
+            self.apply(replay)
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+        except Exception:
+            with self._lock:
+                self._replay = None
+            self._stale = True
+            raise
+
+
+name_index = NameIndex()
+
+
+def invalidate_on_commit(db: Session) -> None:
+    """Have the index rebuilt once db commits (for bulk writes that bypass the ORM)"""
+    db.info[_INVALIDATE] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _stage_flush(session, flush_context):
+    """Stage name changes of flushed Student rows"""
+    staged = None
+    for obj in (*session.deleted, *session.new, *session.dirty):
+        if not isinstance(obj, Student):
+            continue
+        if obj in session.deleted or obj.deleted_at is not None:
+            change = (obj.student_id, None)
+        elif obj in session.new or _changed(obj, "name", "deleted_at"):
+            change = (obj.student_id, obj.name)
+        else:
+            continue
+        if staged is None:
+            staged = session.info.setdefault(_STAGED, [])
+        staged.append(change)
+
+
+def _changed(obj: Student, *attributes: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session, transaction):
+    """Remember how much was staged when a savepoint starts"""
+    if transaction.nested:
+        session.info.setdefault(_MARKS, {})[transaction] = len(session.info.get(_STAGED, ()))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_savepoint(session, transaction):
+    marks = session.info.get(_MARKS)
+    if marks:
+        marks.pop(transaction, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_on_commit(session):
+    # Releasing a savepoint commits nothing yet; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    staged = session.info.pop(_STAGED, None)
+    if session.info.pop(_INVALIDATE, False):
+        name_index.invalidate()
+    elif staged:
+        name_index.apply(staged)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    if session.in_nested_transaction():
+        # Drop only what the rolled-back savepoint staged
+        mark = session.info.get(_MARKS, {}).get(session.get_nested_transaction())
+        staged = session.info.get(_STAGED)
+        if mark is not None and staged:
+            del staged[mark:]
+        return
+    session.info.pop(_STAGED, None)
+    session.info.pop(_INVALIDATE, None)
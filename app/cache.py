@@ -0,0 +1,378 @@
+"""
+Write-invalidated result caching
+
+Every commit that wrote to a table bumps that table's version. Cached results
+remember the versions they were computed at and are discarded once any of
+them moves on, or once their TTL expires.
+
+Caching is off unless QUERY_CACHE_ENABLED=true. Versions and query results
+live in process memory, or with QUERY_CACHE_BACKEND=sqlite in a SQLite file
+on local disk, so every worker on the host shares one cache and sees the
+others' writes. A per-process cache would serve a worker stale results after
+another worker's write, so the backend defaults to sqlite whenever
+WEB_CONCURRENCY asks for more than one worker.
+"""
+import functools
+import inspect
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from enum import Enum
+from typing import Any, Callable, Hashable, Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "false").lower() == "true"
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "30"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+QUERY_CACHE_BACKEND = os.getenv(
+    "QUERY_CACHE_BACKEND", "sqlite" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "memory"
+).lower()
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join(tempfile.gettempdir(), "student-room-cache.sqlite3"))
+
+
+class SharedStore:
+    """
+    Versions and cache entries in a SQLite file shared by local workers.
+
+    Entries are evicted oldest-written first once their pickled size exceeds
+    max_bytes; hits don't write, so readers never contend for the file lock.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, versions TEXT NOT NULL, expires REAL NOT NULL, "
+                "payload BLOB NOT NULL, size INTEGER NOT NULL, stored REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_stored ON entries (stored)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def versions(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        rows = dict(self._connect().execute(
+            f"SELECT name, version FROM versions WHERE name IN ({','.join('?' * len(tables))})", tables
+        ))
+        return tuple(rows.get(table, 0) for table in tables)
+
+    def all_versions(self) -> dict[str, int]:
+        return {name: version for name, version in self._connect().execute("SELECT name, version FROM versions")}
+
+    def bump(self, tables: Iterable[str]) -> None:
+        self._connect().executemany(
+            "INSERT INTO versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            [(table,) for table in tables]
+        )
+
+    def get(self, key: str) -> Optional[tuple[tuple[int, ...], float, bytes]]:
+        row = self._connect().execute(
+            "SELECT versions, expires, payload FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return tuple(int(v) for v in row[0].split(",") if v), row[1], row[2]
+
+    def set(self, key: str, versions: tuple[int, ...], expires: float, payload: bytes) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, versions, expires, payload, size, stored) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, ",".join(map(str, versions)), expires, payload, len(payload), time.time())
+        )
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+        if excess > 0:
+            # Drop the shortest run of oldest entries that frees `excess` bytes
+            conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM ("
+                "SELECT key, size, SUM(size) OVER (ORDER BY stored, key) AS running FROM entries"
+                ") WHERE running - size < ?)",
+                (excess,)
+            )
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        count, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": size}
+
+
+_versions: dict[str, int] = {}
+_versions_lock = threading.Lock()
+_shared: Optional[SharedStore] = (
+    SharedStore(QUERY_CACHE_PATH, QUERY_CACHE_MAX_BYTES) if QUERY_CACHE_BACKEND == "sqlite" else None
+)
+
+
+def table_versions(tables: Iterable[str]) -> tuple[int, ...]:
+    """Current version of each table"""
+    if _shared is not None:
+        return _shared.versions(tuple(tables))
+    return tuple(_versions.get(table, 0) for table in tables)
+
+
+def _all_versions() -> dict[str, int]:
+    if _shared is not None:
+        return _shared.all_versions()
+    with _versions_lock:
+        return dict(_versions)
+
+
+def bump_tables(tables: Iterable[str]) -> None:
+    """Invalidate cached results depending on these tables"""
+    if _shared is not None:
+        _shared.bump(tables)
+        return
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _versions_at_begin(session, transaction):
+    """Note table versions before the transaction's first statement"""
+    # A REPEATABLE READ snapshot taken later in the transaction is at least
+    # this fresh, so results read inside it are safe to stamp with these
+    if QUERY_CACHE_ENABLED and transaction.parent is None:
+        session.info["versions_at_begin"] = _all_versions()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    """Record tables touched by ORM unit-of-work writes"""
+    written = session.info.setdefault("written_tables", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        written.add(obj.__table__.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    """Record tables touched by bulk UPDATE/DELETE/INSERT statements"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        written = orm_execute_state.session.info.setdefault("written_tables", set())
+        written.add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    # Releasing a savepoint commits nothing yet; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    written = session.info.pop("written_tables", None)
+    if written:
+        bump_tables(written)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    # A rolled-back savepoint leaves earlier writes of the transaction in
+    # place; keeping its tables only costs a spare invalidation
+    if not session.in_nested_transaction():
+        session.info.pop("written_tables", None)
+
+
+class ResultCache:
+    """Bounded LRU of results keyed by arbitrary hashable keys"""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[tuple[int, ...], float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, tables: tuple[str, ...], compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing it if missing or stale"""
+        versions = table_versions(tables)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (versions, now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class QueryCache:
+    """
+    Cache for CRUD query results, bounded by total pickled size.
+
+    Results are stored pickled, so every hit hands out fresh objects; ORM
+    instances are attached to the caller's session with merge(load=False),
+    which doesn't touch the database.
+    """
+
+    def __init__(
+            self,
+            ttl: float = QUERY_CACHE_TTL,
+            max_bytes: int = QUERY_CACHE_MAX_BYTES,
+            shared: Optional[SharedStore] = _shared
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: OrderedDict[str, tuple[tuple[int, ...], float, bytes]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get_or_compute(self, db: Session, key: str, tables: tuple[str, ...], compute: Callable[[], Any]) -> Any:
+        """Return the cached result for key, running compute() if missing or stale"""
+        # The session's own uncommitted writes aren't visible to other sessions
+        if db.info.get("written_tables") or db.new or db.dirty or db.deleted:
+            self.bypassed += 1
+            return compute()
+
+        versions = table_versions(tables)
+        entry = self._get(key)
+        if entry is not None and entry[0] == versions and entry[1] > time.time():
+            self.hits += 1
+            return _attach(db, pickle.loads(entry[2]))
+
+        self.misses += 1
+        if db.in_transaction():
+            # An open transaction may read from a snapshot older than the
+            # current versions; stamp the result with those it began at
+            begun = db.info.get("versions_at_begin")
+            if begun is None:
+                return compute()
+            versions = tuple(begun.get(table, 0) for table in tables)
+        value = compute()
+        self._set(key, versions, time.time() + self.ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        return value
+
+    def _get(self, key: str) -> Optional[tuple[tuple[int, ...], float, bytes]]:
+        if self.shared is not None:
+            return self.shared.get(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key: str, versions: tuple[int, ...], expires: float, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        if self.shared is not None:
+            self.shared.set(key, versions, expires, payload)
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[2])
+            self._entries[key] = (versions, expires, payload)
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[2])
+
+    def clear(self) -> None:
+        if self.shared is not None:
+            self.shared.clear()
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        stored = self.shared.stats() if self.shared is not None else {"entries": len(self._entries), "bytes": self._size}
+        return {
+            "backend": "sqlite" if self.shared is not None else "memory",
+            **stored,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed
+        }
+
+
+def _attach(db: Session, value: Any) -> Any:
+    """Merge unpickled ORM instances into the caller's session"""
+    if isinstance(value, list) and value and hasattr(value[0], "_sa_instance_state"):
+        return [db.merge(obj, load=False) for obj in value]
+    return value
+
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of a query argument for cache keys"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    if value == "":
+        return None
+    return value
+
+
+query_cache = QueryCache()
+
+
+def cached_query(*tables: str, **flag_tables: str) -> Callable:
+    """
+    Cache a CRUD read function taking (db, ...) until one of `tables` is written.
+
+    The key is the function name plus its bound, normalized arguments, so
+    positional and keyword calls and enum members vs. raw values share entries.
+    flag_tables maps a boolean parameter to a table the result also depends
+    on when it is set, e.g. include_room="Rooms".
+    """
+    def decorate(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(db: Session, *args, **kwargs):
+            if not QUERY_CACHE_ENABLED:
+                return fn(db, *args, **kwargs)
+            bound = signature.bind(db, *args, **kwargs)
+            bound.apply_defaults()
+            params = sorted((name, _normalize(value)) for name, value in bound.arguments.items() if name != "db")
+            key = f"{fn.__module__}.{fn.__qualname__}:{params!r}"
+            depends = tables + tuple(table for flag, table in flag_tables.items() if bound.arguments[flag])
+            return query_cache.get_or_compute(db, key, depends, lambda: fn(db, *args, **kwargs))
+
+        return wrapper
+    return decorate
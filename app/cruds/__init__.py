@@ -3,9 +3,13 @@ CRUD operations package - centralized imports
 """
 
 from .base import (
+    StudentRecord,
+    RoomRecord,
     count_students,
     count_rooms,
     get_unassigned_students,
+    count_unassigned_students,
+    get_roster_stats,
     count_students_filtered,
     count_rooms_filtered
 )
@@ -13,6 +17,7 @@ from .base import (
 from .room import (
     get_room,
     get_room_with_students,
+    load_room_students,
     get_rooms,
     create_room,
     update_room,
@@ -20,7 +25,8 @@ from .room import (
     room_exists,
     room_has_students,
     get_students_in_room,
-    count_students_in_room
+    count_students_in_room,
+    auto_assign_students
 )
 
 from .student import (
@@ -31,18 +37,35 @@ from .student import (
     update_student,
     delete_student,
     student_exists,
-    move_student
+    move_student,
+    graduate_student,
+    get_student_changes
 )
 
+from .archive import (
+    get_archived_student,
+    get_archived_students,
+    count_archived_students_filtered,
+    get_students_with_archived,
+    archive_graduated_students
+)
+
+from .sync import StudentSync, parse_roster_line, sync_roster_file
+
 __all__ = [
+    "StudentRecord",
+    "RoomRecord",
     "count_students",
     "count_rooms",
     "get_unassigned_students",
+    "count_unassigned_students",
+    "get_roster_stats",
     "count_students_filtered",
     "count_rooms_filtered",
 
     "get_room",
     "get_room_with_students",
+    "load_room_students",
     "get_rooms",
     "create_room",
     "update_room",
@@ -51,6 +74,7 @@ __all__ = [
     "room_has_students",
     "get_students_in_room",
     "count_students_in_room",
+    "auto_assign_students",
 
     "get_student",
     "get_student_with_room",
@@ -59,5 +83,17 @@ __all__ = [
     "update_student",
     "delete_student",
     "student_exists",
-    "move_student"
+    "move_student",
+    "graduate_student",
+    "get_student_changes",
+
+    "get_archived_student",
+    "get_archived_students",
+    "count_archived_students_filtered",
+    "get_students_with_archived",
+    "archive_graduated_students",
+
+    "StudentSync",
+    "parse_roster_line",
+    "sync_roster_file"
 ]
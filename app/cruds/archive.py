@@ -0,0 +1,200 @@
+"""
+Archive tier for graduated students
+"""
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Optional, Type
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from app.autocomplete import invalidate_on_commit
+from app.cache import cached_query
+from app.models import Student, ArchivedStudent, utcnow
+from app.schemas import SexEnum, SortOrderEnum, StudentSortEnum
+from app.cruds.base import sharded_count, merge_shard_pages, contains_pattern, BINARY_COLLATION
+from app.cruds.student import get_students, _STUDENT_SORT_KEYS
+
+_ARCHIVE_SORT_COLUMNS = {
+    StudentSortEnum.STUDENT_ID: ArchivedStudent.student_id,
+    StudentSortEnum.NAME: ArchivedStudent.name,
+    StudentSortEnum.BIRTHDAY: ArchivedStudent.birthday,
+}
+
+
+def _archive_filters(
+        name: Optional[str] = None,
+        sex: Optional[SexEnum] = None,
+        room_id: Optional[int] = None,
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None
+) -> list:
+    """The student list filters as clauses on ArchivedStudents (room_id is the last room)"""
+    clauses = []
+    if name:
+        clauses.append(ArchivedStudent.name.ilike(contains_pattern(name), escape="/"))
+    if sex:
+        clauses.append(ArchivedStudent.sex == sex)
+    if room_id:
+        clauses.append(ArchivedStudent.room_id == room_id)
+    if has_room is not None:
+        clauses.append(ArchivedStudent.room_id.is_not(None) if has_room else ArchivedStudent.room_id.is_(None))
+    if born_after:
+        clauses.append(ArchivedStudent.birthday >= born_after)
+    if born_before:
+        clauses.append(ArchivedStudent.birthday <= born_before)
+    return clauses
+
+
+def get_archived_student(db: Session, student_id: int) -> Optional[ArchivedStudent]:
+    """Get archived student by ID"""
+    return db.scalars(select(ArchivedStudent).where(ArchivedStudent.student_id == student_id)).first()
+
+
+@cached_query("ArchivedStudents")
+def get_archived_students(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        name: Optional[str] = None,
+        sex: Optional[SexEnum] = None,
+        room_id: Optional[int] = None,
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None,
+        sort: StudentSortEnum = StudentSortEnum.STUDENT_ID,
+        order: SortOrderEnum = SortOrderEnum.ASC,
+        binary_collation: bool = False
+) -> list[Type[ArchivedStudent]]:
+    """Get archived students with the same filtering and sorting as get_students"""
+    column = _ARCHIVE_SORT_COLUMNS[sort]
+    if binary_collation and sort == StudentSortEnum.NAME:
+        column = column.collate(BINARY_COLLATION)
+    if order == SortOrderEnum.DESC:
+        order_by = (column.desc(), ArchivedStudent.student_id.desc())
+    else:
+        order_by = (column.asc(), ArchivedStudent.student_id.asc())
+
+    return db.scalars(
+        select(ArchivedStudent)
+        .where(*_archive_filters(name, sex, room_id, has_room, born_after, born_before))
+        .order_by(*order_by)
+        .offset(skip)
+        .limit(limit)
+    ).all()
+
+
+@cached_query("ArchivedStudents")
+def count_archived_students_filtered(
+        db: Session,
+        name: Optional[str] = None,
+        sex: Optional[SexEnum] = None,
+        room_id: Optional[int] = None,
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None
+) -> int:
+    """Count archived students with the same filters as get_students"""
+    return db.scalar(
+        select(func.count()).select_from(ArchivedStudent)
+        .where(*_archive_filters(name, sex, room_id, has_room, born_after, born_before))
+    )
+
+
+def get_students_with_archived(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        name: Optional[str] = None,
+        sex: Optional[SexEnum] = None,
+        room_id: Optional[int] = None,
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None,
+        sort: StudentSortEnum = StudentSortEnum.STUDENT_ID,
+        order: SortOrderEnum = SortOrderEnum.ASC,
+        include_room: bool = False
+) -> list[Any]:
+    """
+    Get active and archived students as one list.
+
+    Both tables return their first skip + limit rows through their own
+    indexes and the page is cut after merging.
+    """
+    filters = dict(
+        name=name, sex=sex, room_id=room_id, has_room=has_room,
+        born_after=born_after, born_before=born_before, sort=sort, order=order
+    )
+    window = skip + limit
+    active = get_students(db, skip=0, limit=window, include_room=include_room, binary_collation=True, **filters)
+    archived = get_archived_students(db, skip=0, limit=window, binary_collation=True, **filters)
+    return merge_shard_pages([active, archived], _STUDENT_SORT_KEYS[sort], order == SortOrderEnum.DESC, skip, limit)
+
+
+def archive_graduated_students(
+        db: Session,
+        graduated_before: Optional[datetime] = None,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[float], None]] = None
+) -> int:
+    """
+    Move graduated students into ArchivedStudents and return how many moved.
+
+    Each batch is copied and deleted in its own short transaction, oldest
+    graduation first. Where the database supports it the batch is locked
+    with SKIP LOCKED, so rows a request is writing are left for a later run
+    instead of being waited on. A re-enrolled student replaces their earlier
+    archive row.
+    """
+    cutoff = graduated_before or utcnow()
+    if cutoff.tzinfo is not None:
+        cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+    eligible = (
+        Student.graduated_at.is_not(None),
+        Student.graduated_at <= cutoff,
+        Student.deleted_at.is_(None)
+    )
+    total = sharded_count(db, select(func.count()).select_from(Student).where(*eligible))
+
+    archived = 0
+    while True:
+        rows = db.execute(
+            select(
+                Student.student_id, Student.name, Student.birthday,
+                Student.sex, Student.room_id, Student.graduated_at
+            )
+            .where(*eligible)
+            .order_by(Student.graduated_at, Student.student_id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            break
+
+        # Moved rows stop matching, so the next batch picks up where this one ended
+        student_ids = [row.student_id for row in rows]
+        now = utcnow()
+        db.execute(delete(ArchivedStudent).where(ArchivedStudent.student_id.in_(student_ids)))
+        db.execute(insert(ArchivedStudent.__table__), [
+            {
+                "student_id": row.student_id,
+                "birthday": row.birthday,
+                "name": row.name,
+                "sex": row.sex,
+                "room_id": row.room_id,
+                "graduated_at": row.graduated_at,
+                "archived_at": now
+            }
+            for row in rows
+        ])
+        db.execute(
+            delete(Student)
+            .where(Student.student_id.in_(student_ids))
+            .execution_options(synchronize_session=False)
+        )
+        invalidate_on_commit(db)
+        db.commit()
+
+        archived += len(rows)
+        if progress and total:
+            progress(archived / total)
+
+    return archived
@@ -1,49 +1,281 @@
-from typing import Optional, Type
+import base64
+import heapq
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, NamedTuple, Optional, Type
+from sqlalchemy import func, extract, select, lambda_stmt, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
-from app.models import Student, Room
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from dotenv import load_dotenv
+from app.cache import cached_query
+from app.database import engine, is_sharded, shard_router
+from app.models import Student, Room, utcnow
 from app.schemas import SexEnum
+from app.exceptions import InvalidChangeTokenError
 
+load_dotenv()
 
+# Margin kept below the change feed horizon for clock skew between app hosts
+# and the database, and for rows stamped just before their INSERT is sent
+CHANGE_FEED_LAG = timedelta(milliseconds=float(os.getenv("CHANGE_FEED_LAG_MS", "2000")))
+
+# Start of the oldest other open transaction, with the database clock's UTC offset
+_OLDEST_TRANSACTION = {
+    "mysql": text(
+        "SELECT NOW(6), UTC_TIMESTAMP(6), MIN(trx_started) FROM information_schema.innodb_trx "
+        "WHERE trx_mysql_thread_id <> CONNECTION_ID()"
+    ),
+    "postgresql": text(
+        "SELECT LOCALTIMESTAMP, now() AT TIME ZONE 'utc', MIN(xact_start) AT TIME ZONE current_setting('TimeZone') "
+        "FROM pg_stat_activity WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid()"
+    ),
+}
+
+# Collation ordering text by code point, the way Python compares str. Pages
+# merged in Python (across shards or tables) are sorted by name with it.
+BINARY_COLLATION = {"mysql": "utf8mb4_bin", "postgresql": "C"}.get(engine.dialect.name, "BINARY")
+
+logger = logging.getLogger(__name__)
+
+
+class StudentRecord(NamedTuple):
+    """Read-only student row, loaded without ORM instances or the identity map"""
+    student_id: int
+    name: str
+    birthday: date
+    sex: SexEnum
+    room_id: Optional[int]
+
+
+class RoomRecord(NamedTuple):
+    """Read-only room row, loaded without ORM instances or the identity map"""
+    room_id: int
+    name: str
+    capacity: Optional[int]
+
+
+# Columns selected for each record type, in field order
+STUDENT_RECORD_COLUMNS = (Student.student_id, Student.name, Student.birthday, Student.sex, Student.room_id)
+ROOM_RECORD_COLUMNS = (Room.room_id, Room.name, Room.capacity)
+
+
+def sharded_count(db: Session, stmt) -> int:
+    """Run a count statement, summed over every shard in parallel when db is sharded"""
+    if is_sharded(db):
+        return sum(shard_router.fan_out(lambda shard_db: shard_db.scalar(stmt)))
+    return db.scalar(stmt)
+
+
+def merge_shard_pages(
+        pages: list[list[Any]],
+        key: Callable[[Any], Any],
+        descending: bool,
+        skip: int,
+        limit: int
+) -> list[Any]:
+    """
+    Merge per-shard (or per-table) result pages into one globally ordered page.
+
+    Every source must have returned its first skip + limit rows in the same
+    order, so the rows of the requested page are among them.
+    """
+    merged = heapq.merge(*pages, key=key, reverse=descending)
+    return [row for _, row in zip(range(skip + limit), merged)][skip:]
+
+
+@cached_query("Students")
 def count_students(db: Session) -> int:
     """Count total students"""
-    return db.query(Student).count()
+    return sharded_count(db, lambda_stmt(
+        lambda: select(func.count()).select_from(Student).where(Student.deleted_at.is_(None))
+    ))
 
 
+@cached_query("Rooms")
 def count_rooms(db: Session) -> int:
     """Count total rooms"""
-    return db.query(Room).count()
+    return sharded_count(db, lambda_stmt(
+        lambda: select(func.count()).select_from(Room).where(Room.deleted_at.is_(None))
+    ))
 
 
 def get_unassigned_students(db: Session) -> list[Type[Student]]:
     """Get students not assigned to any room"""
-    return db.query(Student).filter(Student.room_id.is_(None)).all()
+    return db.scalars(lambda_stmt(
+        lambda: select(Student).where(Student.deleted_at.is_(None), Student.room_id.is_(None))
+    )).all()
 
 
-def count_students_filtered(
-        db: Session,
+@cached_query("Students")
+def count_unassigned_students(db: Session) -> int:
+    """Count students not assigned to any room"""
+    return sharded_count(db, lambda_stmt(
+        lambda: select(func.count()).select_from(Student)
+        .where(Student.deleted_at.is_(None), Student.room_id.is_(None))
+    ))
+
+
+def contains_pattern(text: str) -> str:
+    """
+    LIKE pattern matching text literally anywhere in a value (use with escape="/").
+
+    Escaping happens here and not with autoescape=True, which can't see the
+    value inside a lambda_stmt.
+    """
+    escaped = text.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return f"%{escaped}%"
+
+
+def apply_student_filters(
+        stmt: StatementLambdaElement,
         name: Optional[str] = None,
         sex: Optional[SexEnum] = None,
         room_id: Optional[int] = None,
-        has_room: Optional[bool] = None
-) -> int:
-    """Count students with same filters as get_students"""
-    query = db.query(Student)
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None
+) -> StatementLambdaElement:
+    """
+    Add the student list filters to a lambda statement.
 
+    Each filter is its own lambda, so every filter combination maps to one
+    cached statement and the values travel as bound parameters.
+    """
     if name:
-        query = query.filter(Student.name.ilike(f"%{name}%"))
+        pattern = contains_pattern(name)
+        stmt += lambda s: s.where(Student.name.ilike(pattern, escape="/"))
     if sex:
-        query = query.filter(Student.sex == sex)
+        stmt += lambda s: s.where(Student.sex == sex)
     if room_id:
-        query = query.filter(Student.room_id == room_id)
+        stmt += lambda s: s.where(Student.room_id == room_id)
     if has_room is not None:
         if has_room:
-            query = query.filter(Student.room_id.is_not(None))
+            stmt += lambda s: s.where(Student.room_id.is_not(None))
         else:
-            query = query.filter(Student.room_id.is_(None))
+            stmt += lambda s: s.where(Student.room_id.is_(None))
+    if born_after:
+        stmt += lambda s: s.where(Student.birthday >= born_after)
+    if born_before:
+        stmt += lambda s: s.where(Student.birthday <= born_before)
+    return stmt
+
+
+def get_roster_stats(db: Session) -> dict:
+    """
+    Compute roster statistics with grouped aggregates.
+
+    Ages are counted per birth year (the age reached in the current year),
+    so no student rows are loaded.
+    """
+    total = count_students(db)
+    unassigned = count_unassigned_students(db)
+    active = Student.deleted_at.is_(None)
+
+    birth_year = extract("year", Student.birthday)
+    current_year = date.today().year
+    # Accumulated, since a sharded session returns one group per shard
+    years: dict[int, int] = {}
+    for year, count in db.execute(
+        select(birth_year, func.count(Student.student_id))
+        .where(active)
+        .group_by(birth_year)
+    ):
+        years[int(year)] = years.get(int(year), 0) + count
+    age_distribution = [
+        {"birth_year": year, "age": current_year - year, "count": count}
+        for year, count in sorted(years.items())
+    ]
+
+    sex_counts = {sex.value: 0 for sex in SexEnum}
+    rooms: dict[int, dict[str, int]] = {}
+    for room_id, sex, count in db.execute(
+        select(Student.room_id, Student.sex, func.count(Student.student_id))
+        .where(active)
+        .group_by(Student.room_id, Student.sex)
+    ):
+        sex_counts[sex.value] += count
+        if room_id is not None:
+            rooms.setdefault(room_id, {s.value: 0 for s in SexEnum})[sex.value] = count
 
-    return query.count()
+    return {
+        "total": total,
+        "assigned": total - unassigned,
+        "unassigned": unassigned,
+        "sex": sex_counts,
+        "age_distribution": age_distribution,
+        "rooms": [
+            {"room_id": room_id, "male": counts["M"], "female": counts["F"]}
+            for room_id, counts in sorted(rooms.items())
+        ]
+    }
+
+
+@cached_query("Students")
+def count_students_filtered(
+        db: Session,
+        name: Optional[str] = None,
+        sex: Optional[SexEnum] = None,
+        room_id: Optional[int] = None,
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None
+) -> int:
+    """Count students with same filters as get_students"""
+    stmt = lambda_stmt(
+        lambda: select(func.count()).select_from(Student).where(Student.deleted_at.is_(None))
+    )
+    stmt = apply_student_filters(stmt, name, sex, room_id, has_room, born_after, born_before)
+    return sharded_count(db, stmt)
 
 
 def count_rooms_filtered(db: Session) -> int:
     """Count rooms (no filters for now, but keeping consistent pattern)"""
-    return db.query(Room).count()
+    return count_rooms(db)
+
+
+def change_horizon(db: Session) -> datetime:
+    """
+    Newest change time the change feed may hand out.
+
+    updated_at is stamped when a row is flushed, not when it commits, so a
+    transaction that is still open can later commit rows older than rows
+    already visible. Changes are only served up to the start of the oldest
+    open transaction (MySQL and PostgreSQL report it; other databases only
+    get the lag), less CHANGE_FEED_LAG. On a sharded database the earliest
+    shard's horizon applies everywhere, since pages are merged across shards.
+    """
+    if is_sharded(db):
+        return min(shard_router.fan_out(change_horizon))
+
+    horizon = utcnow()
+    stmt = _OLDEST_TRANSACTION.get(db.get_bind().dialect.name)
+    if stmt is not None:
+        try:
+            local_now, utc_now, oldest = db.execute(stmt).one()
+        except DBAPIError as exc:
+            # Reading other sessions' transactions needs the PROCESS privilege on MySQL
+            logger.warning("Can't read open transactions, the change feed only lags: %s", exc.orig)
+        else:
+            horizon = utc_now
+            if oldest is not None:
+                horizon = min(horizon, oldest - (local_now - utc_now))
+    return horizon - CHANGE_FEED_LAG
+
+
+def encode_change_token(updated_at: datetime, row_id: int) -> str:
+    """Encode a (updated_at, id) high-water mark as an opaque change token"""
+    raw = f"{updated_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_change_token(token: str) -> tuple[datetime, int]:
+    """Decode a change token produced by encode_change_token"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        updated_at, row_id = raw.split("|")
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except ValueError:
+        raise InvalidChangeTokenError(token)
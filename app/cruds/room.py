@@ -1,60 +1,163 @@
-from typing import Optional, Type
-from sqlalchemy.orm import Session, joinedload
-from app.models import Room, Student
+import heapq
+from array import array
+from datetime import date
+from typing import Any, Callable, Optional, Type, Union
+from sqlalchemy import func, select, update, lambda_stmt
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from app.cache import cached_query
+from app.database import is_sharded, shard_router
+from app.models import Room, Student, utcnow
+from app.cruds.base import (
+    merge_shard_pages,
+    RoomRecord,
+    StudentRecord,
+    ROOM_RECORD_COLUMNS,
+    STUDENT_RECORD_COLUMNS
+)
+from app.schemas import SexEnum, AssignStrategyEnum
 from app.exceptions import (
     RoomNotFoundError,
     RoomAlreadyExistsError,
-    RoomHasStudentsError
+    RoomHasStudentsError,
+    RoomCapacityTooSmallError
 )
 
 
-def get_room(db: Session, room_id: int) -> Optional[Room]:
-    """Get room by ID"""
-    return db.query(Room).filter(Room.room_id == room_id).first()
+# Default of update_room's capacity: keep the current limit (None removes it)
+_KEEP_CAPACITY: Any = object()
 
 
-def get_room_with_students(db: Session, room_id: int) -> Optional[Room]:
-    """Get room by ID with students"""
-    return (
-        db.query(Room)
-        .options(joinedload(Room.students))
-        .filter(Room.room_id == room_id)
-        .first()
-    )
+def get_room(db: Session, room_id: int, for_update: bool = False) -> Optional[Room]:
+    """Get room by ID (for_update locks the row until the transaction ends)"""
+    stmt = lambda_stmt(lambda: select(Room).where(Room.room_id == room_id, Room.deleted_at.is_(None)))
+    if for_update:
+        stmt += lambda s: s.with_for_update()
+    return db.scalars(stmt, bind_arguments=shard_router.room(room_id)).first()
+
+
+def get_room_with_students(db: Session, room_id: int, students_limit: Optional[int] = None) -> Optional[Room]:
+    """Get room by ID with (at most students_limit of) its students"""
+    room = get_room(db, room_id)
+    if room:
+        load_room_students(db, [room], students_limit)
+    return room
+
+
+def load_room_students(db: Session, rooms: list[Room], limit: Optional[int] = None) -> dict[int, int]:
+    """
+    Populate room.students for a page of rooms and count their students.
+
+    Runs two queries however many rooms there are: the students (at most
+    `limit` per room, lowest IDs first, cut per room with ROW_NUMBER) and a
+    grouped count. Returns the full student count per room ID.
+    """
+    room_ids = [room.room_id for room in rooms]
+    if not room_ids:
+        return {}
+
+    active = (Student.room_id.in_(room_ids), Student.deleted_at.is_(None))
+    if limit is None:
+        students = db.scalars(select(Student).where(*active).order_by(Student.room_id, Student.student_id)).all()
+    else:
+        ranked = select(
+            Student,
+            func.row_number().over(partition_by=Student.room_id, order_by=Student.student_id).label("position")
+        ).where(*active).subquery()
+        ranked_student = aliased(Student, ranked)
+        students = db.scalars(
+            select(ranked_student)
+            .where(ranked.c.position <= limit)
+            .order_by(ranked.c.room_id, ranked.c.student_id)
+        ).all()
 
+    by_room: dict[int, list[Student]] = {room_id: [] for room_id in room_ids}
+    for student in students:
+        by_room[student.room_id].append(student)
+    for room in rooms:
+        set_committed_value(room, "students", by_room[room.room_id])
 
-def get_rooms(db: Session, skip: int = 0, limit: int = 100) -> list[Type[Room]]:
-    """Get all rooms"""
-    return db.query(Room).offset(skip).limit(limit).all()
+    counts = dict.fromkeys(room_ids, 0)
+    counts.update(db.execute(
+        select(Student.room_id, func.count()).where(*active).group_by(Student.room_id)
+    ).all())
+    return counts
 
 
-def create_room(db: Session, room_id: int, name: str) -> Room:
+@cached_query("Rooms")
+def get_rooms(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        as_records: bool = False
+) -> list[Union[Type[Room], RoomRecord]]:
+    """Get all rooms (as_records returns RoomRecord tuples instead of ORM instances)"""
+    if as_records:
+        stmt = lambda_stmt(lambda: select(*ROOM_RECORD_COLUMNS).where(Room.deleted_at.is_(None)))
+    else:
+        stmt = lambda_stmt(lambda: select(Room).where(Room.deleted_at.is_(None)))
+
+    def fetch(session: Session) -> list:
+        if as_records:
+            return list(map(RoomRecord._make, session.execute(stmt)))
+        return session.scalars(stmt).all()
+
+    if is_sharded(db):
+        window = skip + limit
+        stmt += lambda s: s.order_by(Room.room_id).limit(window)
+        pages = shard_router.fan_out(fetch)
+        return merge_shard_pages(pages, lambda room: room.room_id, False, skip, limit)
+
+    stmt += lambda s: s.order_by(Room.room_id).offset(skip).limit(limit)
+    return fetch(db)
+
+
+def create_room(db: Session, room_id: int, name: str, capacity: Optional[int] = None) -> Room:
     """Create new room"""
     # Check if room already exists
     if room_exists(db, room_id):
         raise RoomAlreadyExistsError(room_id)
 
-    db_room = Room(room_id=room_id, name=name)
-    db.add(db_room)
+    # Revive a soft-deleted room instead of colliding with its tombstone
+    db_room = db.get(Room, room_id)
+    if db_room:
+        db_room.name = name
+        db_room.capacity = capacity
+        db_room.deleted_at = None
+    else:
+        db_room = Room(room_id=room_id, name=name, capacity=capacity)
+        db.add(db_room)
     db.commit()
     db.refresh(db_room)
     return db_room
 
 
-def update_room(db: Session, room_id: int, name: str) -> Room:
-    """Update room"""
-    db_room = get_room(db, room_id)
+def update_room(db: Session, room_id: int, name: str, capacity: Optional[int] = _KEEP_CAPACITY) -> Room:
+    """
+    Update room; capacity None removes the limit, leaving it out keeps the
+    current one. A capacity can't go below the students already assigned.
+    """
+    limited = capacity is not None and capacity is not _KEEP_CAPACITY
+    # Locked like a student assignment, so no one takes a seat while capacity is checked
+    db_room = get_room(db, room_id, for_update=limited)
     if not db_room:
         raise RoomNotFoundError(room_id)
 
+    if limited:
+        student_count = count_students_in_room(db, room_id)
+        if student_count > capacity:
+            raise RoomCapacityTooSmallError(room_id, capacity, student_count)
+
     db_room.name = name
+    if capacity is not _KEEP_CAPACITY:
+        db_room.capacity = capacity
     db.commit()
     db.refresh(db_room)
     return db_room
 
 
 def delete_room(db: Session, room_id: int) -> Room:
-    """Delete room"""
+    """Delete room (soft delete, kept as a tombstone for delta sync)"""
     db_room = get_room(db, room_id)
     if not db_room:
         raise RoomNotFoundError(room_id)
@@ -64,26 +167,164 @@ def delete_room(db: Session, room_id: int) -> Room:
     if student_count > 0:
         raise RoomHasStudentsError(room_id, student_count)
 
-    db.delete(db_room)
+    db_room.deleted_at = utcnow()
     db.commit()
+    db.refresh(db_room)
     return db_room
 
 
 def room_exists(db: Session, room_id: int) -> bool:
     """Check if room exists"""
-    return db.query(Room).filter(Room.room_id == room_id).first() is not None
+    return db.scalar(lambda_stmt(
+        lambda: select(Room.room_id).where(Room.room_id == room_id, Room.deleted_at.is_(None))
+    ), bind_arguments=shard_router.room(room_id)) is not None
 
 
 def room_has_students(db: Session, room_id: int) -> bool:
     """Check if room has students"""
-    return db.query(Student).filter(Student.room_id == room_id).first() is not None
+    return db.scalar(lambda_stmt(
+        lambda: select(Student.student_id)
+        .where(Student.room_id == room_id, Student.deleted_at.is_(None))
+        .limit(1)
+    ), bind_arguments=shard_router.room(room_id)) is not None
+
 
+def get_students_in_room(
+        db: Session,
+        room_id: int,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        as_records: bool = False
+) -> list[Union[Type[Student], StudentRecord]]:
+    """Get the students in a room, optionally one page (as_records returns StudentRecord tuples)"""
+    shard = shard_router.room(room_id)
+    if as_records:
+        stmt = lambda_stmt(lambda: select(*STUDENT_RECORD_COLUMNS))
+    else:
+        stmt = lambda_stmt(lambda: select(Student))
+    stmt += lambda s: s.where(Student.room_id == room_id, Student.deleted_at.is_(None)).order_by(Student.student_id)
+    if limit is not None:
+        stmt += lambda s: s.offset(skip).limit(limit)
 
-def get_students_in_room(db: Session, room_id: int) -> list[Type[Student]]:
-    """Get all students in a room"""
-    return db.query(Student).filter(Student.room_id == room_id).all()
+    if as_records:
+        return list(map(StudentRecord._make, db.execute(stmt, bind_arguments=shard)))
+    return db.scalars(stmt, bind_arguments=shard).all()
 
 
 def count_students_in_room(db: Session, room_id: int) -> int:
     """Count students in specific room"""
-    return db.query(Student).filter(Student.room_id == room_id).count()
+    return db.scalar(lambda_stmt(
+        lambda: select(func.count()).select_from(Student)
+        .where(Student.room_id == room_id, Student.deleted_at.is_(None))
+    ), bind_arguments=shard_router.room(room_id))
+
+
+def auto_assign_students(
+        db: Session,
+        strategy: AssignStrategyEnum = AssignStrategyEnum.BALANCED,
+        sex: Optional[SexEnum] = None,
+        birth_year: Optional[int] = None,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[float], None]] = None
+) -> tuple[int, int, dict[int, int]]:
+    """
+    Assign unassigned students to rooms with free capacity.
+
+    Only rooms with a capacity are considered. The plan is computed in memory
+    over an array of student IDs and applied with one UPDATE per room and batch,
+    all in a single transaction. Returns (assigned, remaining, per-room counts).
+    On a sharded database each shard is planned and committed on its own,
+    since students can only join rooms on their shard.
+    """
+    if is_sharded(db):
+        results = shard_router.fan_out(lambda shard_db: auto_assign_students(
+            shard_db, strategy, sex, birth_year, batch_size, progress
+        ))
+        counts = {}
+        for _, _, shard_counts in results:
+            counts.update(shard_counts)
+        return sum(result[0] for result in results), sum(result[1] for result in results), counts
+
+    # Lock capacity-bounded rooms so concurrent runs can't overfill them
+    rooms = db.execute(
+        select(Room.room_id, Room.capacity)
+        .where(Room.deleted_at.is_(None), Room.capacity.is_not(None))
+        .order_by(Room.room_id)
+        .with_for_update()
+    ).all()
+    occupied = dict(db.execute(
+        select(Student.room_id, func.count(Student.student_id))
+        .where(Student.deleted_at.is_(None), Student.room_id.is_not(None))
+        .group_by(Student.room_id)
+    ).all())
+    free = [(room_id, capacity - occupied.get(room_id, 0)) for room_id, capacity in rooms]
+
+    stmt = select(Student.student_id).where(
+        Student.deleted_at.is_(None),
+        Student.room_id.is_(None)
+    )
+    if sex:
+        stmt = stmt.where(Student.sex == sex)
+    if birth_year is not None:
+        stmt = stmt.where(
+            Student.birthday >= date(birth_year, 1, 1),
+            Student.birthday < date(birth_year + 1, 1, 1)
+        )
+    student_ids = array("q", db.scalars(stmt.order_by(Student.student_id)))
+
+    plan = _plan_assignments(len(student_ids), free, strategy)
+    total = sum(count for _, count in plan)
+
+    assigned = 0
+    counts: dict[int, int] = {}
+    offset = 0
+    for room_id, count in plan:
+        for start in range(offset, offset + count, batch_size):
+            chunk = student_ids[start:min(start + batch_size, offset + count)].tolist()
+            # room_id IS NULL guards against students assigned since they were read
+            result = db.execute(
+                update(Student)
+                .where(Student.student_id.in_(chunk), Student.room_id.is_(None))
+                .values(room_id=room_id)
+                .execution_options(synchronize_session=False)
+            )
+            assigned += result.rowcount
+            counts[room_id] = counts.get(room_id, 0) + result.rowcount
+            if progress:
+                progress(min(start + batch_size, total) / total)
+        offset += count
+
+    db.commit()
+    return assigned, len(student_ids) - assigned, counts
+
+
+def _plan_assignments(
+        student_count: int,
+        free: list[tuple[int, int]],
+        strategy: AssignStrategyEnum
+) -> list[tuple[int, int]]:
+    """Split student_count students into (room_id, count) slices"""
+    plan = []
+    if strategy == AssignStrategyEnum.GREEDY:
+        remaining = student_count
+        for room_id, seats in free:
+            if remaining <= 0:
+                break
+            count = min(seats, remaining)
+            if count > 0:
+                plan.append((room_id, count))
+                remaining -= count
+        return plan
+
+    # Balanced: each student goes to the room with the most free seats
+    heap = [(-seats, room_id) for room_id, seats in free if seats > 0]
+    heapq.heapify(heap)
+    counts: dict[int, int] = {}
+    for _ in range(student_count):
+        if not heap:
+            break
+        seats, room_id = heapq.heappop(heap)
+        counts[room_id] = counts.get(room_id, 0) + 1
+        if seats + 1 < 0:
+            heapq.heappush(heap, (seats + 1, room_id))
+    return sorted(counts.items())
@@ -1,29 +1,73 @@
-from typing import Optional, Type
-from sqlalchemy.orm import Session, joinedload
-from app.models import Student, Room
-from app.schemas import SexEnum
+from datetime import date, datetime
+from typing import Optional, Type, Union
+from sqlalchemy import func, inspect, select, tuple_, lambda_stmt
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.cache import cached_query
+from app.database import is_sharded, shard_router
+from app.models import Student, Room, ArchivedStudent, utcnow
+from app.schemas import SexEnum, SortOrderEnum, StudentSortEnum
+from app.cruds.base import (
+    apply_student_filters,
+    change_horizon,
+    BINARY_COLLATION,
+    encode_change_token,
+    decode_change_token,
+    merge_shard_pages,
+    StudentRecord,
+    STUDENT_RECORD_COLUMNS
+)
 from app.exceptions import (
     StudentNotFoundError,
     StudentAlreadyExistsError,
-    InvalidRoomAssignmentError
+    InvalidRoomAssignmentError,
+    RoomFullError
 )
 
 
 def get_student(db: Session, student_id: int) -> Optional[Student]:
     """Get student by ID"""
-    return db.query(Student).filter(Student.student_id == student_id).first()
+    return db.scalars(lambda_stmt(
+        lambda: select(Student).where(Student.student_id == student_id, Student.deleted_at.is_(None))
+    )).first()
 
 
 def get_student_with_room(db: Session, student_id: int) -> Optional[Student]:
     """Get student by ID with room"""
-    return (
-        db.query(Student)
+    return db.scalars(lambda_stmt(
+        lambda: select(Student)
         .options(joinedload(Student.room))
-        .filter(Student.student_id == student_id)
-        .first()
-    )
+        .where(Student.student_id == student_id, Student.deleted_at.is_(None))
+    )).first()
+
+
+# student_id breaks ties so offset paging is stable
+_STUDENT_ORDER = {
+    (StudentSortEnum.STUDENT_ID, SortOrderEnum.ASC): (Student.student_id.asc(),),
+    (StudentSortEnum.STUDENT_ID, SortOrderEnum.DESC): (Student.student_id.desc(),),
+    (StudentSortEnum.NAME, SortOrderEnum.ASC): (Student.name.asc(), Student.student_id.asc()),
+    (StudentSortEnum.NAME, SortOrderEnum.DESC): (Student.name.desc(), Student.student_id.desc()),
+    (StudentSortEnum.BIRTHDAY, SortOrderEnum.ASC): (Student.birthday.asc(), Student.student_id.asc()),
+    (StudentSortEnum.BIRTHDAY, SortOrderEnum.DESC): (Student.birthday.desc(), Student.student_id.desc()),
+}
 
+# Orderings for pages merged in Python: names compared by code point, since
+# the default collation (e.g. utf8mb4_0900_ai_ci) has no Python equivalent
+_binary_name = Student.name.collate(BINARY_COLLATION)
+_STUDENT_BINARY_ORDER = {
+    **_STUDENT_ORDER,
+    (StudentSortEnum.NAME, SortOrderEnum.ASC): (_binary_name.asc(), Student.student_id.asc()),
+    (StudentSortEnum.NAME, SortOrderEnum.DESC): (_binary_name.desc(), Student.student_id.desc()),
+}
 
+# The binary orderings in Python, for merging the pages
+_STUDENT_SORT_KEYS = {
+    StudentSortEnum.STUDENT_ID: lambda student: student.student_id,
+    StudentSortEnum.NAME: lambda student: (student.name, student.student_id),
+    StudentSortEnum.BIRTHDAY: lambda student: (student.birthday, student.student_id),
+}
+
+
+@cached_query("Students", include_room="Rooms")
 def get_students(
         db: Session,
         skip: int = 0,
@@ -31,24 +75,50 @@ def get_students(
         name: Optional[str] = None,
         sex: Optional[SexEnum] = None,
         room_id: Optional[int] = None,
-        has_room: Optional[bool] = None
-) -> list[Type[Student]]:
-    """Get students with optional filtering"""
-    query = db.query(Student)
-
-    if name:
-        query = query.filter(Student.name.ilike(f"%{name}%"))
-    if sex:
-        query = query.filter(Student.sex == sex)
-    if room_id:
-        query = query.filter(Student.room_id == room_id)
-    if has_room is not None:
-        if has_room:
-            query = query.filter(Student.room_id.is_not(None))
-        else:
-            query = query.filter(Student.room_id.is_(None))
-
-    return query.offset(skip).limit(limit).all()
+        has_room: Optional[bool] = None,
+        born_after: Optional[date] = None,
+        born_before: Optional[date] = None,
+        sort: StudentSortEnum = StudentSortEnum.STUDENT_ID,
+        order: SortOrderEnum = SortOrderEnum.ASC,
+        include_room: bool = False,
+        as_records: bool = False,
+        binary_collation: bool = False
+) -> list[Union[Type[Student], StudentRecord]]:
+    """
+    Get students with optional filtering and sorting.
+
+    include_room loads rooms in one extra query. as_records returns
+    StudentRecord tuples instead of ORM instances, for read-only callers
+    that only serialize the page (it can't be combined with include_room).
+    binary_collation sorts names by code point, for callers merging the
+    page with others by _STUDENT_SORT_KEYS; sharded reads always do.
+    """
+    if as_records:
+        stmt = lambda_stmt(lambda: select(*STUDENT_RECORD_COLUMNS).where(Student.deleted_at.is_(None)))
+    else:
+        stmt = lambda_stmt(lambda: select(Student).where(Student.deleted_at.is_(None)))
+    stmt = apply_student_filters(stmt, name, sex, room_id, has_room, born_after, born_before)
+    if include_room:
+        stmt += lambda s: s.options(selectinload(Student.room))
+
+    def fetch(session: Session) -> list:
+        if as_records:
+            return list(map(StudentRecord._make, session.execute(stmt)))
+        return session.scalars(stmt).all()
+
+    if is_sharded(db) or binary_collation:
+        order_by = _STUDENT_BINARY_ORDER[(sort, order)]
+    else:
+        order_by = _STUDENT_ORDER[(sort, order)]
+    if is_sharded(db):
+        # Each shard returns its first skip + limit rows; the page is cut after merging
+        window = skip + limit
+        stmt += lambda s: s.order_by(*order_by).limit(window)
+        pages = shard_router.fan_out(fetch)
+        return merge_shard_pages(pages, _STUDENT_SORT_KEYS[sort], order == SortOrderEnum.DESC, skip, limit)
+
+    stmt += lambda s: s.order_by(*order_by).offset(skip).limit(limit)
+    return fetch(db)
 
 
 def create_student(
@@ -57,25 +127,35 @@ def create_student(
         name: str,
         birthday,
         sex: SexEnum,
-        room_id: Optional[int] = None
+        room_id: Optional[int] = None,
+        commit: bool = True
 ) -> Student:
-    """Create new student"""
+    """Create new student (commit=False only flushes, for group commit)"""
     if student_exists(db, student_id):
         raise StudentAlreadyExistsError(student_id)
 
-    if room_id is not None and not _room_exists(db, room_id):
-        raise InvalidRoomAssignmentError(room_id)
+    if room_id is not None:
+        _check_room_assignment(db, room_id)
 
-    db_student = Student(
-        student_id=student_id,
-        name=name,
-        birthday=birthday,
-        sex=sex,
-        room_id=room_id
-    )
-    db.add(db_student)
-    db.commit()
-    db.refresh(db_student)
+    # Revive a soft-deleted student instead of colliding with its tombstone
+    db_student = db.get(Student, student_id)
+    if db_student:
+        db_student.name = name
+        db_student.birthday = birthday
+        db_student.sex = sex
+        db_student.room_id = room_id
+        db_student.deleted_at = None
+    else:
+        db_student = Student(
+            student_id=student_id,
+            name=name,
+            birthday=birthday,
+            sex=sex,
+            room_id=room_id
+        )
+        db.add(db_student)
+    db_student = _colocate(db, db_student)
+    _finish_write(db, db_student, commit)
     return db_student
 
 
@@ -92,8 +172,8 @@ def update_student(
     if not db_student:
         raise StudentNotFoundError(student_id)
 
-    if room_id is not None and not _room_exists(db, room_id):
-        raise InvalidRoomAssignmentError(room_id)
+    if room_id is not None and room_id != db_student.room_id:
+        _check_room_assignment(db, room_id)
 
     if name is not None:
         db_student.name = name
@@ -104,42 +184,169 @@ def update_student(
     if room_id is not None:
         db_student.room_id = room_id
 
+    db_student = _colocate(db, db_student)
     db.commit()
     db.refresh(db_student)
     return db_student
 
 
 def delete_student(db: Session, student_id: int) -> Student:
-    """Delete student"""
+    """Delete student (soft delete, kept as a tombstone for delta sync)"""
     db_student = get_student(db, student_id)
     if not db_student:
         raise StudentNotFoundError(student_id)
 
-    db.delete(db_student)
+    db_student.deleted_at = utcnow()
     db.commit()
+    db.refresh(db_student)
     return db_student
 
 
 def student_exists(db: Session, student_id: int) -> bool:
     """Check if student exists"""
-    return db.query(Student).filter(Student.student_id == student_id).first() is not None
+    return db.scalar(lambda_stmt(
+        lambda: select(Student.student_id)
+        .where(Student.student_id == student_id, Student.deleted_at.is_(None))
+    )) is not None
 
 
-def move_student(db: Session, student_id: int, room_id: Optional[int]) -> Student:
-    """Move student to different room (or unassign if room_id is None)"""
+def move_student(db: Session, student_id: int, room_id: Optional[int], commit: bool = True) -> Student:
+    """Move student to different room or unassign (commit=False only flushes, for group commit)"""
     db_student = get_student(db, student_id)
     if not db_student:
         raise StudentNotFoundError(student_id)
 
-    if room_id is not None and not _room_exists(db, room_id):
-        raise InvalidRoomAssignmentError(room_id)
+    if room_id is not None and room_id != db_student.room_id:
+        _check_room_assignment(db, room_id)
 
     db_student.room_id = room_id
-    db.commit()
-    db.refresh(db_student)
+    db_student = _colocate(db, db_student)
+    _finish_write(db, db_student, commit)
     return db_student
 
 
-def _room_exists(db: Session, room_id: int) -> bool:
-    """Helper function to check if room exists (to avoid circular import)"""
-    return db.query(Room).filter(Room.room_id == room_id).first() is not None
+def graduate_student(db: Session, student_id: int) -> Student:
+    """Mark a student as graduated (moved to the archive by the next archive run)"""
+    db_student = get_student(db, student_id)
+    if not db_student:
+        raise StudentNotFoundError(student_id)
+
+    if db_student.graduated_at is None:
+        db_student.graduated_at = utcnow()
+        db.commit()
+        db.refresh(db_student)
+    return db_student
+
+
+def get_student_changes(
+        db: Session,
+        since: Optional[str] = None,
+        limit: int = 100,
+        horizon: Optional[datetime] = None
+) -> tuple[list[Union[Type[Student], Type[ArchivedStudent]]], Optional[str]]:
+    """
+    Get students inserted, updated, deleted or archived after a change token.
+
+    Rows are returned in (updated_at, student_id) order, including soft-deleted
+    tombstones, together with the token to pass on the next call. Archiving
+    deletes a student's row outright, so its ArchivedStudents row stands in
+    as a deletion stamped with archived_at. Only rows older than
+    change_horizon() are returned, so a transaction committing late can't
+    slip in behind a token that has already moved past it. Callers that
+    need to know how far a page reaches can pass a horizon they computed.
+    """
+    if horizon is None:
+        horizon = change_horizon(db)
+    stmt = lambda_stmt(lambda: select(Student).where(Student.updated_at < horizon))
+    archived_stmt = select(ArchivedStudent).where(ArchivedStudent.archived_at < horizon)
+    if since:
+        updated_at, student_id = decode_change_token(since)
+        stmt += lambda s: s.where(
+            tuple_(Student.updated_at, Student.student_id) > tuple_(updated_at, student_id)
+        )
+        archived_stmt = archived_stmt.where(
+            tuple_(ArchivedStudent.archived_at, ArchivedStudent.student_id) > tuple_(updated_at, student_id)
+        )
+    stmt += lambda s: s.order_by(Student.updated_at, Student.student_id).limit(limit)
+    archived_stmt = archived_stmt.order_by(ArchivedStudent.archived_at, ArchivedStudent.student_id).limit(limit)
+
+    if is_sharded(db):
+        pages = shard_router.fan_out(lambda shard_db: shard_db.scalars(stmt).all())
+    else:
+        pages = [db.scalars(stmt).all()]
+    pages.append(db.scalars(archived_stmt).all())
+    changes = merge_shard_pages(pages, lambda change: (change.updated_at, change.student_id), False, 0, limit)
+
+    if not changes:
+        return changes, since
+
+    last = changes[-1]
+    return changes, encode_change_token(last.updated_at, last.student_id)
+
+
+def _finish_write(db: Session, db_student: Student, commit: bool) -> None:
+    """Commit and reload, or just flush when the caller owns the transaction"""
+    if commit:
+        db.commit()
+        db.refresh(db_student)
+    else:
+        db.flush()
+
+
+def _colocate(db: Session, db_student: Student) -> Student:
+    """
+    Keep an assigned student on its room's shard.
+
+    A row can't change shards in place, so a student assigned to a room on
+    another shard is re-inserted there and deleted from its old shard; the
+    shards commit one after the other, not atomically.
+    """
+    if not is_sharded(db) or db_student.room_id is None:
+        return db_student
+
+    state = inspect(db_student)
+    target = shard_router.shard_for_room(db_student.room_id)
+    if state.key is None or state.identity_token == target:
+        return db_student
+
+    moved = Student(
+        student_id=db_student.student_id,
+        name=db_student.name,
+        birthday=db_student.birthday,
+        sex=db_student.sex,
+        room_id=db_student.room_id,
+        graduated_at=db_student.graduated_at,
+        deleted_at=db_student.deleted_at
+    )
+    db.delete(db_student)
+    # Flush the delete first; otherwise the unit of work turns the delete and
+    # insert of the same key into an UPDATE on the old shard
+    db.flush()
+    db.add(moved)
+    return moved
+
+
+def _check_room_assignment(db: Session, room_id: int) -> None:
+    """
+    Helper function to validate a room assignment (to avoid circular import).
+
+    The room row stays locked until the caller's transaction ends, so
+    concurrent assignments (and auto-assign runs) can't both take its last seat.
+    """
+    shard = shard_router.room(room_id)
+    capacity = db.execute(lambda_stmt(
+        lambda: select(Room.capacity)
+        .where(Room.room_id == room_id, Room.deleted_at.is_(None))
+        .with_for_update()
+    ), bind_arguments=shard).first()
+    if capacity is None:
+        raise InvalidRoomAssignmentError(room_id)
+
+    capacity, = capacity
+    if capacity is not None:
+        occupied = db.scalar(lambda_stmt(
+            lambda: select(func.count()).select_from(Student)
+            .where(Student.room_id == room_id, Student.deleted_at.is_(None))
+        ), bind_arguments=shard)
+        if occupied >= capacity:
+            raise RoomFullError(room_id, capacity)
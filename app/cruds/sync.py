@@ -0,0 +1,190 @@
+"""
+Full-roster reconciliation (diff-and-apply sync)
+"""
+import os
+from array import array
+from typing import Callable, Iterable, Optional
+from pydantic import ValidationError as PydanticValidationError
+from sqlalchemy import select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import Student, Room, utcnow
+from app.schemas import StudentCreate
+from app.database import is_sharded
+from app.autocomplete import invalidate_on_commit
+from app.exceptions import InvalidRoomAssignmentError, NotSupportedError, RoomFullError, ValidationError
+
+_INSERTS = {
+    "mysql": mysql.insert,
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert
+}
+
+
+class StudentSync:
+    """
+    Reconcile the Students table with an authoritative roster.
+
+    Feed the roster in chunks with apply(), then call finish(). Each chunk is
+    compared by key against the stored rows and only inserts, updates and
+    moves are written, as one upsert per chunk; finish() soft-deletes every
+    active student the roster didn't mention and commits. Nothing is committed
+    before finish(), so a bad roster leaves the table untouched.
+
+    Afterwards the active students are exactly the roster, so room capacities
+    are checked against the roster's own assignments. The rooms stay locked
+    for the whole sync so no concurrent assignment can slip in alongside it.
+    """
+
+    def __init__(self, db: Session, batch_size: int = 1000):
+        if is_sharded(db):
+            raise NotSupportedError("Roster sync is not supported on a sharded database")
+        self.db = db
+        self.batch_size = batch_size
+        self.seen: set[int] = set()
+        self.capacities = {
+            room_id: capacity for room_id, capacity in db.execute(
+                select(Room.room_id, Room.capacity).where(Room.deleted_at.is_(None)).with_for_update()
+            )
+        }
+        self.occupancy: dict[int, int] = {}
+        self.summary = {"inserted": 0, "updated": 0, "moved": 0, "deleted": 0, "unchanged": 0}
+
+    def apply(self, students: Iterable[StudentCreate]) -> None:
+        """Diff one chunk of the roster and write its changes"""
+        incoming = {}
+        for student in students:
+            if student.student_id in self.seen or student.student_id in incoming:
+                raise ValidationError(f"Student with id '{student.student_id}' appears more than once")
+            if student.room_id is not None:
+                self._take_seat(student.room_id)
+            incoming[student.student_id] = (student.name, student.birthday, student.sex.value, student.room_id)
+
+        ids = list(incoming)
+        for start in range(0, len(ids), self.batch_size):
+            self._apply_batch({student_id: incoming[student_id] for student_id in ids[start:start + self.batch_size]})
+        self.seen.update(ids)
+
+    def finish(self) -> dict:
+        """Delete students missing from the roster, commit and return the summary"""
+        missing = array("q")
+        rows = self.db.scalars(
+            select(Student.student_id)
+            .where(Student.deleted_at.is_(None))
+            .execution_options(yield_per=10000)
+        )
+        for student_id in rows:
+            if student_id not in self.seen:
+                missing.append(student_id)
+
+        now = utcnow()
+        for start in range(0, len(missing), self.batch_size):
+            result = self.db.execute(
+                update(Student)
+                .where(Student.student_id.in_(missing[start:start + self.batch_size].tolist()))
+                .values(deleted_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            self.summary["deleted"] += result.rowcount
+
+        invalidate_on_commit(self.db)
+        self.db.commit()
+        return self.summary
+
+    def _take_seat(self, room_id: int) -> None:
+        if room_id not in self.capacities:
+            raise InvalidRoomAssignmentError(room_id)
+        occupancy = self.occupancy.get(room_id, 0) + 1
+        capacity = self.capacities[room_id]
+        if capacity is not None and occupancy > capacity:
+            raise RoomFullError(room_id, capacity)
+        self.occupancy[room_id] = occupancy
+
+    def _apply_batch(self, incoming: dict[int, tuple]) -> None:
+        stored = {
+            student_id: (name, birthday, sex.value, room_id, deleted_at)
+            for student_id, name, birthday, sex, room_id, deleted_at in self.db.execute(
+                select(
+                    Student.student_id, Student.name, Student.birthday,
+                    Student.sex, Student.room_id, Student.deleted_at
+                ).where(Student.student_id.in_(list(incoming)))
+            )
+        }
+
+        changed = []
+        for student_id, values in incoming.items():
+            current = stored.get(student_id)
+            if current is None or current[4] is not None:
+                self.summary["inserted"] += 1
+            elif current[:4] == values:
+                self.summary["unchanged"] += 1
+                continue
+            elif current[:3] == values[:3]:
+                self.summary["moved"] += 1
+            else:
+                self.summary["updated"] += 1
+
+            name, birthday, sex, room_id = values
+            changed.append({
+                "student_id": student_id,
+                "name": name,
+                "birthday": birthday,
+                "sex": sex,
+                "room_id": room_id,
+                "updated_at": utcnow(),
+                "deleted_at": None
+            })
+
+        if changed:
+            self._upsert(changed)
+
+    def _upsert(self, rows: list[dict]) -> None:
+        """INSERT ... ON DUPLICATE KEY UPDATE (or the dialect's equivalent)"""
+        dialect = self.db.get_bind().dialect.name
+        insert = _INSERTS[dialect]
+        stmt = insert(Student.__table__)
+        columns = ("name", "birthday", "sex", "room_id", "updated_at", "deleted_at")
+        if dialect == "mysql":
+            stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in columns})
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Student.student_id],
+                set_={column: stmt.excluded[column] for column in columns}
+            )
+        # executemany keeps one cached statement per dialect instead of
+        # compiling a fresh multi-row VALUES clause for every batch
+        self.db.execute(stmt, rows)
+
+
+def parse_roster_line(line: bytes, line_number: int) -> Optional[StudentCreate]:
+    """Parse one NDJSON roster line (None for blank lines)"""
+    if not line.strip():
+        return None
+    try:
+        return StudentCreate.model_validate_json(line)
+    except PydanticValidationError as exc:
+        raise ValidationError(f"Invalid roster line {line_number}: {exc.errors()[0]['msg']}")
+
+
+def sync_roster_file(
+        db: Session,
+        path: str,
+        chunk_size: int = 5000,
+        progress: Optional[Callable[[float], None]] = None
+) -> dict:
+    """Run a StudentSync over a spooled NDJSON roster file"""
+    size = os.path.getsize(path) or 1
+    sync = StudentSync(db)
+    batch = []
+    with open(path, "rb") as roster:
+        for line_number, line in enumerate(roster, start=1):
+            student = parse_roster_line(line, line_number)
+            if student is not None:
+                batch.append(student)
+            if len(batch) >= chunk_size:
+                sync.apply(batch)
+                batch = []
+                if progress:
+                    progress(roster.tell() / size)
+    sync.apply(batch)
+    return sync.finish()
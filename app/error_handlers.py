@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 
 async def app_exception_handler(request: Request, exc: AppException):
     """Handle custom application exceptions"""
-    logger.warning(f"Application error: {exc.message}")
+    logger.warning("Application error: %s", exc.message, extra={"log_key": type(exc).__name__})
 
     return JSONResponse(
         status_code=exc.status_code,
@@ -19,7 +19,8 @@ async def app_exception_handler(request: Request, exc: AppException):
             "error": exc.__class__.__name__,
             "message": exc.message,
             "status_code": exc.status_code
-        }
+        },
+        headers=exc.headers
     )
 
 
@@ -37,8 +38,6 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle Pydantic validation errors"""
-    logger.warning(f"Validation error: {exc.errors()}")
-
     errors = []
     for error in exc.errors():
         field = " -> ".join(str(x) for x in error["loc"])
@@ -48,6 +47,9 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "type": error["type"]
         })
 
+    if logger.isEnabledFor(logging.WARNING):
+        logger.warning("Validation error on %s: %s", request.url.path, errors, extra={"log_key": request.url.path})
+
     return JSONResponse(
         status_code=422,
         content={
@@ -61,7 +63,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 async def integrity_error_handler(request: Request, exc: IntegrityError):
     """Handle database integrity errors"""
-    logger.error(f"Database integrity error: {exc}")
+    logger.error("Database integrity error: %s", exc, extra={"log_key": request.url.path})
 
     error_message = str(exc.orig)
 
@@ -84,7 +86,12 @@ async def integrity_error_handler(request: Request, exc: IntegrityError):
 
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions"""
-    logger.error(f"Unexpected error: {exc}", exc_info=True)
+    logger.error(
+        "Unexpected error: %s",
+        exc,
+        exc_info=exc,
+        extra={"log_key": (request.url.path, type(exc).__name__)}
+    )
 
     return JSONResponse(
         status_code=500,
@@ -1,8 +1,12 @@
+from typing import Optional
+
+
 class AppException(Exception):
     """Base application exception"""
-    def __init__(self, message: str, status_code: int = 500):
+    def __init__(self, message: str, status_code: int = 500, headers: Optional[dict[str, str]] = None):
         self.message = message
         self.status_code = status_code
+        self.headers = headers
         super().__init__(self.message)
 
 
@@ -13,6 +17,12 @@ class NotFoundError(AppException):
         super().__init__(message, 404)
 
 
+class ForbiddenError(AppException):
+    """Raised when the caller is not allowed to perform an operation"""
+    def __init__(self, message: str):
+        super().__init__(message, 403)
+
+
 class ConflictError(AppException):
     """Raised when there's a conflict (e.g., duplicate IDs)"""
     def __init__(self, message: str):
@@ -31,6 +41,28 @@ class BusinessLogicError(AppException):
         super().__init__(message, 400)
 
 
+class ServiceUnavailableError(AppException):
+    """Raised when the server is temporarily unable to take the request"""
+    def __init__(self, message: str):
+        super().__init__(message, 503)
+
+
+class RateLimitExceededError(AppException):
+    """Raised when a client has used up its request allowance"""
+    def __init__(self, retry_after: int):
+        super().__init__(
+            f"Rate limit exceeded. Please retry in {retry_after} second(s).",
+            429,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class NotSupportedError(AppException):
+    """Raised when an operation isn't available in the current deployment"""
+    def __init__(self, message: str):
+        super().__init__(message, 501)
+
+
 class RoomNotFoundError(NotFoundError):
     """Raised when room is not found"""
     def __init__(self, room_id: int):
@@ -64,7 +96,40 @@ class RoomHasStudentsError(BusinessLogicError):
         )
 
 
+class RoomCapacityTooSmallError(BusinessLogicError):
+    """Raised when lowering a room's capacity below its current number of students"""
+    def __init__(self, room_id: int, capacity: int, student_count: int):
+        super().__init__(
+            f"Cannot set capacity of room '{room_id}' to {capacity}. It has {student_count} student(s) assigned. "
+            f"Please move students out first."
+        )
+
+
 class InvalidRoomAssignmentError(BusinessLogicError):
     """Raised when trying to assign student to non-existent room"""
     def __init__(self, room_id: int):
         super().__init__(f"Cannot assign student to room '{room_id}'. Room does not exist.")
+
+
+class InvalidChangeTokenError(ValidationError):
+    """Raised when a delta sync change token cannot be decoded"""
+    def __init__(self, token: str):
+        super().__init__(f"Invalid change token '{token}'")
+
+
+class RoomFullError(BusinessLogicError):
+    """Raised when assigning a student to a room that is at capacity"""
+    def __init__(self, room_id: int, capacity: int):
+        super().__init__(f"Cannot assign student to room '{room_id}'. Room is full (capacity {capacity}).")
+
+
+class JobNotFoundError(NotFoundError):
+    """Raised when background job is not found"""
+    def __init__(self, job_id: str):
+        super().__init__("Job", job_id)
+
+
+class JobQueueFullError(ServiceUnavailableError):
+    """Raised when too many background jobs are already waiting"""
+    def __init__(self, limit: int):
+        super().__init__(f"Job queue is full ({limit} jobs waiting). Please retry later.")
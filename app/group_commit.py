@@ -0,0 +1,162 @@
+"""
+Group commit for concurrent single-row writes
+
+Opt-in with GROUP_COMMIT_ENABLED=true. Writes submitted while another batch
+is committing (or within GROUP_COMMIT_WINDOW_MS of the first one) are run in
+one transaction and committed together, so a burst costs one commit instead
+of one per request. Each write runs in its own SAVEPOINT: a write that fails
+is rolled back alone and its caller gets its own exception, while the rest
+of the batch still commits.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+
+load_dotenv()
+
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() == "true"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+logger = logging.getLogger(__name__)
+
+WriteOp = Callable[[Session], Any]
+
+
+class GroupCommit:
+    """
+    Collects write operations and commits them in batches.
+
+    An operation is a callable taking a session that does its work without
+    committing (the crud functions with commit=False). One batch is in flight
+    at a time; operations arriving meanwhile form the next batch, so batches
+    grow with load and commits per second stop being the ceiling.
+    """
+
+    def __init__(
+            self,
+            enabled: bool = GROUP_COMMIT_ENABLED,
+            window: float = GROUP_COMMIT_WINDOW_MS / 1000,
+            max_batch: int = GROUP_COMMIT_MAX_BATCH
+    ):
+        self.enabled = enabled
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[WriteOp, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.operations = 0
+        self.retried = 0
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Run op in the next batch and return its result (or raise its error)"""
+        if not self.enabled:
+            return await run_in_threadpool(_run_alone, op)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._drain())
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return await future
+
+    async def _drain(self) -> None:
+        while self._pending:
+            # Give concurrent writers the window to join, unless the batch is already full
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            try:
+                outcomes = await run_in_threadpool(self._commit_batch, [op for op, _ in batch])
+            except Exception as exc:
+                outcomes = [(False, exc)] * len(batch)
+
+            for (_, future), (ok, value) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _commit_batch(self, ops: list[WriteOp]) -> list[tuple[bool, Any]]:
+        self.batches += 1
+        self.operations += len(ops)
+        outcomes: list[tuple[bool, Any]] = []
+
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            for op in ops:
+                savepoint = db.begin_nested()
+                try:
+                    result = op(db)
+                    savepoint.commit()
+                except Exception as exc:
+                    savepoint.rollback()
+                    outcomes.append((False, exc))
+                else:
+                    outcomes.append((True, result))
+            db.commit()
+            # Results are served after the session closes; keep their loaded state
+            db.expunge_all()
+            return outcomes
+        except SQLAlchemyError as exc:
+            # The batch commit itself failed; fall back to one transaction
+            # per operation so each caller sees its own outcome
+            db.rollback()
+            logger.warning("Group commit of %d writes failed, retrying individually: %s", len(ops), exc)
+            self.retried += 1
+            return [_outcome(op) for op in ops]
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        return {
+            "enabled": self.enabled,
+            "batches": self.batches,
+            "operations": self.operations,
+            "retried": self.retried,
+            "pending": len(self._pending)
+        }
+
+
+def _run_alone(op: WriteOp) -> Any:
+    """Run one operation in its own transaction"""
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        result = op(db)
+        db.commit()
+        db.expunge_all()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _outcome(op: WriteOp) -> tuple[bool, Any]:
+    try:
+        return True, _run_alone(op)
+    except Exception as exc:
+        return False, exc
+
+
+group_commit = GroupCommit()
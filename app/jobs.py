@@ -0,0 +1,359 @@
+"""
+Background job runner for long-running bulk operations
+
+Jobs run on a bounded in-process thread pool, each with its own SessionLocal
+session, and their state lives in the Jobs table. Handlers report progress
+through a JobContext, which is also where cancellation is noticed: a
+cancelled job raises out of its handler and its transaction is rolled back.
+
+Several API workers share the Jobs table, so a job is only run by the worker
+whose conditional UPDATE moves it from queued to running. Running jobs hold a
+lease that a heartbeat renews every JOB_HEARTBEAT_SECONDS; a sweep re-queues
+running jobs whose lease lapsed (their worker died) and picks up queued jobs
+nobody has claimed for a lease period. On startup a worker also dispatches
+every queued job left by a previous process.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from sqlalchemy import and_, select, update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+import app.cruds as crud
+from app.database import SessionLocal, engine
+from app.exceptions import AppException, JobNotFoundError, JobQueueFullError
+from app.models import Job, JobStatusEnum, utcnow
+from app.schemas import ArchiveSummary, AssignStrategyEnum, AutoAssignResponse, RoomAssignment, SexEnum
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "student-room-jobs"))
+# A running job not heartbeated for JOB_LEASE_SECONDS is taken to have lost its worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+
+_PERSIST_PROGRESS = engine.dialect.name != "sqlite"
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Any]
+_handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register a handler(db, params, ctx) for a job kind"""
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = handler
+        return handler
+    return register
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled"""
+
+
+class JobContext:
+    """Progress reporting and cancellation checks for a running job"""
+
+    def __init__(self, job_id: str, cancelled: threading.Event, min_interval: float = 0.5):
+        self.job_id = job_id
+        self.cancelled = cancelled
+        self.min_interval = min_interval
+        self.fraction = 0.0
+        self._last_report = 0.0
+
+    def progress(self, fraction: float) -> None:
+        """Record progress and stop if the job was cancelled"""
+        if self.cancelled.is_set():
+            raise JobCancelled()
+        self.fraction = min(max(fraction, 0.0), 1.0)
+
+        now = time.monotonic()
+        if now - self._last_report < self.min_interval:
+            return
+        self._last_report = now
+
+        # Separate session: the handler's own transaction stays uncommitted.
+        # SQLite allows a single writer, which the handler already is, so
+        # there progress is only kept in memory and the flag is just read.
+        db = SessionLocal()
+        try:
+            job = db.get(Job, self.job_id)
+            if job.cancel_requested:
+                self.cancelled.set()
+            elif _PERSIST_PROGRESS:
+                job.progress = self.fraction
+                db.commit()
+        finally:
+            db.close()
+
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+
+class JobRunner:
+    """Bounded worker pool executing persisted jobs"""
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: set[str] = set()
+        self._running: dict[str, JobContext] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start the pool, pick up queued and abandoned jobs and start heartbeating"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+        self._stop.clear()
+        self.recover(all_queued=True)
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def recover(self, all_queued: bool = False) -> None:
+        """
+        Re-queue running jobs whose lease expired and dispatch them along with
+        queued jobs unclaimed for a lease period (or all queued jobs)
+        """
+        now = utcnow()
+        expired = now - timedelta(seconds=JOB_LEASE_SECONDS)
+        abandoned = and_(Job.status == JobStatusEnum.RUNNING, Job.updated_at < expired)
+        db = SessionLocal()
+        try:
+            job_ids = set(db.scalars(select(Job.job_id).where(abandoned)))
+            if job_ids:
+                # Conditional, so a job heartbeated in the meantime keeps running
+                db.execute(
+                    update(Job)
+                    .where(Job.job_id.in_(job_ids), abandoned)
+                    .values(status=JobStatusEnum.QUEUED, progress=0.0, updated_at=now)
+                )
+                db.commit()
+            queued = select(Job.job_id).where(Job.status == JobStatusEnum.QUEUED)
+            if not all_queued:
+                queued = queued.where(Job.updated_at < expired)
+            job_ids.update(db.scalars(queued))
+        finally:
+            db.close()
+
+        for job_id in job_ids:
+            self._dispatch(job_id)
+
+    def shutdown(self) -> None:
+        """Stop taking work; unfinished jobs resume on the next start"""
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, kind: str, params: dict) -> Job:
+        """Persist a new job and queue it for execution"""
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        with self._lock:
+            if len(self._pending) >= self.queue_limit:
+                raise JobQueueFullError(self.queue_limit)
+
+        db = SessionLocal()
+        try:
+            job = Job(job_id=uuid.uuid4().hex, kind=kind, params=params, status=JobStatusEnum.QUEUED)
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+
+        self._dispatch(job.job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued job now, or ask a running one to stop"""
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            if job is None:
+                raise JobNotFoundError(job_id)
+            if job.status == JobStatusEnum.QUEUED:
+                job.status = JobStatusEnum.CANCELLED
+            elif job.status == JobStatusEnum.RUNNING:
+                job.cancel_requested = True
+                with self._lock:
+                    if job_id in self._running:
+                        self._running[job_id].cancelled.set()
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def progress(self, job_id: str) -> Optional[float]:
+        """Live progress of a job running in this process, if any"""
+        ctx = self._running.get(job_id)
+        return ctx.fraction if ctx else None
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        return {
+            "workers": self.workers,
+            "pending": len(self._pending),
+            "running": len(self._running)
+        }
+
+    def _dispatch(self, job_id: str) -> None:
+        with self._lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id: str) -> None:
+        try:
+            self._execute(job_id)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+
+    def _heartbeat(self) -> None:
+        """Renew the leases of this process's running jobs and sweep abandoned ones"""
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            with self._lock:
+                running = list(self._running)
+            db = SessionLocal()
+            try:
+                if running:
+                    db.execute(
+                        update(Job)
+                        .where(Job.job_id.in_(running), Job.status == JobStatusEnum.RUNNING)
+                        .values(updated_at=utcnow())
+                    )
+                    db.commit()
+                self.recover()
+            except Exception as exc:
+                # SQLite's single writer is usually a running handler, so
+                # missed heartbeats are expected there; leases must outlast jobs
+                if _PERSIST_PROGRESS:
+                    logger.warning("Job heartbeat failed: %s", exc)
+            finally:
+                db.close()
+
+    def _claim(self, job_id: str) -> Optional[tuple[str, dict]]:
+        """Move a queued job to running; its kind and params if this worker won it"""
+        db = SessionLocal()
+        try:
+            claimed = db.execute(
+                update(Job)
+                .where(Job.job_id == job_id, Job.status == JobStatusEnum.QUEUED)
+                .values(status=JobStatusEnum.RUNNING, updated_at=utcnow())
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+            kind, params = db.execute(select(Job.kind, Job.params).where(Job.job_id == job_id)).one()
+            return kind, params or {}
+        finally:
+            db.close()
+
+    def _execute(self, job_id: str) -> None:
+        claimed = self._claim(job_id)
+        if claimed is None:
+            return
+        kind, params = claimed
+
+        status, result, error = JobStatusEnum.SUCCEEDED, None, None
+        ctx = JobContext(job_id, threading.Event())
+        with self._lock:
+            self._running[job_id] = ctx
+        work_db = SessionLocal()
+        try:
+            result = _handlers[kind](work_db, params, ctx)
+        except JobCancelled:
+            status = JobStatusEnum.CANCELLED
+        except AppException as exc:
+            status, error = JobStatusEnum.FAILED, exc.message
+        except Exception as exc:
+            logger.error("Job %s (%s) failed: %s", job_id, kind, exc, exc_info=exc)
+            status, error = JobStatusEnum.FAILED, "An unexpected error occurred"
+        finally:
+            work_db.close()
+            with self._lock:
+                self._running.pop(job_id, None)
+
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            job.status = status
+            job.result = result
+            job.error = error
+            if status == JobStatusEnum.SUCCEEDED:
+                job.progress = 1.0
+            db.commit()
+        finally:
+            db.close()
+
+
+def get_job(db: Session, job_id: str) -> Job:
+    """Get a job by ID, with live progress if it runs in this process"""
+    job = db.get(Job, job_id)
+    if job is None:
+        raise JobNotFoundError(job_id)
+    live = job_runner.progress(job_id)
+    if live is not None and job.status == JobStatusEnum.RUNNING:
+        db.expunge(job)
+        job.progress = max(job.progress, live)
+    return job
+
+
+def spool_path() -> str:
+    """New file path for a request body handed over to a job"""
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    return os.path.join(JOB_SPOOL_DIR, f"{uuid.uuid4().hex}.ndjson")
+
+
+@job_handler("auto_assign")
+def _auto_assign_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    assigned, remaining, counts = crud.auto_assign_students(
+        db=db,
+        strategy=AssignStrategyEnum(params["strategy"]),
+        sex=SexEnum(params["sex"]) if params.get("sex") else None,
+        birth_year=params.get("birth_year"),
+        progress=ctx.progress
+    )
+    return AutoAssignResponse(
+        assigned=assigned,
+        remaining=remaining,
+        rooms=[RoomAssignment(room_id=room_id, assigned=count) for room_id, count in sorted(counts.items())]
+    ).model_dump()
+
+
+@job_handler("roster_sync")
+def _roster_sync_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    try:
+        return crud.sync_roster_file(db, params["path"], progress=ctx.progress)
+    finally:
+        if os.path.exists(params["path"]):
+            os.remove(params["path"])
+
+
+@job_handler("archive_students")
+def _archive_students_job(db: Session, params: dict, ctx: JobContext) -> dict:
+    graduated_before = params.get("graduated_before")
+    archived = crud.archive_graduated_students(
+        db,
+        graduated_before=datetime.fromisoformat(graduated_before) if graduated_before else None,
+        progress=ctx.progress
+    )
+    return ArchiveSummary(archived=archived).model_dump()
+
+
+job_runner = JobRunner()
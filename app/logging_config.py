@@ -0,0 +1,135 @@
+"""
+Non-blocking application logging
+
+Records from the "app" logger are put on a bounded in-memory queue and
+formatted/written by a background listener thread, so request handlers never
+wait on I/O. Repeated identical messages are rate limited per key, and the
+next message that gets through reports how many were suppressed.
+"""
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", "5"))
+LOG_RATE_LIMIT_INTERVAL = float(os.getenv("LOG_RATE_LIMIT_INTERVAL", "10"))
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `burst` records per key every `interval` seconds.
+
+    The key is the logger, level and unformatted message template plus an
+    optional `log_key` passed via `extra`, so nothing is rendered to decide.
+    """
+
+    def __init__(self, burst: int = LOG_RATE_LIMIT_BURST, interval: float = LOG_RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg, getattr(record, "log_key", None))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self._windows) > 10000:
+                    self._windows.clear()
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                self.suppressed += 1
+                return False
+
+        if suppressed:
+            record.msg = f"{record.msg} (%d similar messages suppressed)"
+            record.args = (*record.args, suppressed) if isinstance(record.args, tuple) else (suppressed,)
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread.
+
+    The stock QueueHandler renders the message (and traceback) in the calling
+    thread before enqueueing; records here stay in-process so that isn't needed.
+    A full queue drops the record instead of blocking the request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[DeferredQueueHandler] = None
+_rate_limit = RateLimitFilter()
+
+
+def setup_logging() -> None:
+    """Route the "app" logger through the background queue"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _handler = DeferredQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _handler.addFilter(_rate_limit)
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+    _listener = QueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener, _handler
+    if _listener is None:
+        return
+
+    _listener.stop()
+    logging.getLogger("app").removeHandler(_handler)
+    _listener = None
+    _handler = None
+
+
+def logging_stats() -> dict:
+    """Counters for the metrics endpoint"""
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "suppressed": _rate_limit.suppressed
+    }
@@ -1,18 +1,29 @@
 import os
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
 
-from app.database import init_db
+from app.database import init_db, SessionLocal
+from app.cache import query_cache
 from app.exceptions import AppException
+from app.schemas import ErrorResponse
+from app.logging_config import setup_logging, shutdown_logging, logging_stats
+from app.profiling import ProfilingMiddleware
+from app.watchdog import WatchdogMiddleware, loop_watchdog, WATCHDOG_ENABLED
 from app.error_handlers import (
     app_exception_handler,
     validation_exception_handler,
     integrity_error_handler,
     general_exception_handler
 )
-from app.routers import students, rooms
+from app.routers import students, rooms, stats, jobs
+from app.jobs import job_runner
+from app.singleflight import singleflight
+from app.group_commit import group_commit
+from app.snapshot import student_snapshot, STUDENT_SNAPSHOT_ENABLED
+from app.autocomplete import name_index
+from app.ratelimit import rate_limit, rate_limiter
 
 load_dotenv()
 
@@ -24,6 +35,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(WatchdogMiddleware)
+
 app.add_exception_handler(AppException, app_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(IntegrityError, integrity_error_handler)
@@ -32,8 +46,28 @@ app.add_exception_handler(Exception, general_exception_handler)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize logging and database on startup"""
+    setup_logging()
+    if WATCHDOG_ENABLED:
+        loop_watchdog.start()
     init_db()
+    job_runner.start()
+
+    db = SessionLocal()
+    try:
+        name_index.build(db)
+        if STUDENT_SNAPSHOT_ENABLED and student_snapshot.available:
+            student_snapshot.build(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background jobs and the watchdog, and flush queued log records on shutdown"""
+    job_runner.shutdown()
+    loop_watchdog.stop()
+    shutdown_logging()
 
 
 @app.get("/")
@@ -46,7 +80,9 @@ async def root():
         "redoc": "/redoc",
         "endpoints": {
             "students": "/api/v1/students",
-            "rooms": "/api/v1/rooms"
+            "rooms": "/api/v1/rooms",
+            "stats": "/api/v1/stats",
+            "jobs": "/api/v1/jobs"
         }
     }
 
@@ -60,5 +96,29 @@ async def health_check():
     }
 
 
-app.include_router(students.router, prefix="/api/v1/students", tags=["Students"])
-app.include_router(rooms.router, prefix="/api/v1/rooms", tags=["Rooms"])
\ No newline at end of file
+@app.get("/metrics")
+async def metrics():
+    """Runtime metrics for the API process"""
+    return {
+        "singleflight": singleflight.stats(),
+        "stats_cache": stats.stats_cache.stats(),
+        "query_cache": query_cache.stats(),
+        "student_snapshot": student_snapshot.stats(),
+        "logging": logging_stats(),
+        "jobs": job_runner.stats(),
+        "group_commit": group_commit.stats(),
+        "autocomplete": name_index.stats(),
+        "event_loop": loop_watchdog.stats(),
+        "rate_limit": rate_limiter.stats()
+    }
+
+
+rate_limited = dict(
+    dependencies=[Depends(rate_limit)],
+    responses={429: {"model": ErrorResponse, "description": "Rate limit exceeded; see Retry-After"}}
+)
+
+app.include_router(students.router, prefix="/api/v1/students", tags=["Students"], **rate_limited)
+app.include_router(rooms.router, prefix="/api/v1/rooms", tags=["Rooms"], **rate_limited)
+app.include_router(stats.router, prefix="/api/v1/stats", tags=["Stats"], **rate_limited)
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["Jobs"], **rate_limited)
\ No newline at end of file
@@ -1,28 +1,67 @@
 """
 SQLAlchemy database models
 """
-from sqlalchemy import Column, Integer, String, Date, Enum, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, ForeignKey, Index, Float, Boolean, Text, JSON
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from app.database import Base
 import enum
 
 
+# Microsecond precision so change tokens can order writes made within the same second
+Timestamp = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime (matches the DATETIME columns)"""
+    return datetime.utcnow()
+
+
+def _birth_year_partitions(first: int = 1950, last: int = 2030, step: int = 10) -> str:
+    """MySQL RANGE partitioning of a table by YEAR(birthday), one partition per step years"""
+    partitions = [
+        f"PARTITION p{bound - step} VALUES LESS THAN ({bound})"
+        for bound in range(first + step, last + step, step)
+    ]
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return f"RANGE (YEAR(birthday)) ({', '.join(partitions)})"
+
+
 class SexEnum(enum.Enum):
     """Enum for student sex"""
     M = "M"
     F = "F"
 
 
+class JobStatusEnum(enum.Enum):
+    """Enum for background job status"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
 class Room(Base):
     """Room model"""
     __tablename__ = "Rooms"
 
     room_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), nullable=False)
+    capacity = Column(Integer, nullable=True)  # None means no limit
+
+    # Change tracking (soft delete keeps a tombstone for delta sync)
+    updated_at = Column(Timestamp, nullable=False, default=utcnow, onupdate=utcnow)
+    deleted_at = Column(Timestamp, nullable=True)
 
     # Relationship with students
     students = relationship("Student", back_populates="room")
 
+    __table_args__ = (
+        Index("ix_rooms_updated_at", "updated_at", "room_id"),
+    )
+
 
 class Student(Base):
     """Student model"""
@@ -34,5 +73,94 @@ class Student(Base):
     sex = Column(Enum(SexEnum), nullable=False)
     room_id = Column(Integer, ForeignKey("Rooms.room_id"), nullable=True)
 
+    # Change tracking (soft delete keeps a tombstone for delta sync)
+    updated_at = Column(Timestamp, nullable=False, default=utcnow, onupdate=utcnow)
+    deleted_at = Column(Timestamp, nullable=True)
+
+    # Set when the student graduates; graduated students are moved to ArchivedStudents
+    graduated_at = Column(Timestamp, nullable=True)
+
     # Relationship with room
-    room = relationship("Room", back_populates="students")
\ No newline at end of file
+    room = relationship("Room", back_populates="students")
+
+    # Composite indexes: an equality filter (room_id, sex) under any sort is read in
+    # index order. A birthday range under a name or student_id sort is searched
+    # through a birthday index and only the matching rows are sorted; no single
+    # index order can serve both the range and the other column.
+    __table_args__ = (
+        Index("ix_students_updated_at", "updated_at", "student_id"),
+        Index("ix_students_room_id", "room_id", "student_id"),
+        Index("ix_students_room_id_name", "room_id", "name"),
+        Index("ix_students_room_id_birthday", "room_id", "birthday"),
+        Index("ix_students_sex", "sex", "student_id"),
+        Index("ix_students_sex_name", "sex", "name", "student_id"),
+        Index("ix_students_sex_birthday", "sex", "birthday"),
+        Index("ix_students_birthday", "birthday", "student_id"),
+        Index("ix_students_name", "name", "student_id"),
+        Index("ix_students_graduated_at", "graduated_at", "student_id"),
+    )
+
+    @property
+    def deleted(self) -> bool:
+        """Whether the student has been soft-deleted"""
+        return self.deleted_at is not None
+
+    @property
+    def archived(self) -> bool:
+        """Rows in Students are never archived"""
+        return False
+
+
+class ArchivedStudent(Base):
+    """Graduated student moved out of the hot Students table"""
+    __tablename__ = "ArchivedStudents"
+
+    # MySQL requires the partitioning column in every unique key
+    student_id = Column(Integer, primary_key=True)
+    birthday = Column(Date, primary_key=True)
+    name = Column(String(50), nullable=False)
+    sex = Column(Enum(SexEnum), nullable=False)
+    room_id = Column(Integer, nullable=True)  # Last room; not a foreign key, rooms may be deleted later
+    graduated_at = Column(Timestamp, nullable=False)
+    archived_at = Column(Timestamp, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_archived_students_name", "name", "student_id"),
+        Index("ix_archived_students_room_id", "room_id", "student_id"),
+        Index("ix_archived_students_archived_at", "archived_at", "student_id"),
+        {"mysql_partition_by": _birth_year_partitions()},
+    )
+
+    @property
+    def archived(self) -> bool:
+        return True
+
+    @property
+    def updated_at(self) -> datetime:
+        """Archiving is the last change the change feed reports for the student"""
+        return self.archived_at
+
+    @property
+    def deleted(self) -> bool:
+        """Archived students have left the active roster"""
+        return True
+
+
+class Job(Base):
+    """Background job model"""
+    __tablename__ = "Jobs"
+
+    job_id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(Enum(JobStatusEnum), nullable=False, default=JobStatusEnum.QUEUED)
+    params = Column(JSON, nullable=True)
+    progress = Column(Float, nullable=False, default=0.0)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(Timestamp, nullable=False, default=utcnow)
+    updated_at = Column(Timestamp, nullable=False, default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        Index("ix_jobs_status", "status"),
+    )
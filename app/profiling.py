@@ -0,0 +1,177 @@
+"""
+On-demand per-request profiling
+
+A request carrying `X-Profile: <PROFILE_TOKEN>` (or `?profile=<PROFILE_TOKEN>`)
+is run under a sampling profiler and answered with a speedscope file
+(https://www.speedscope.app) instead of its normal body. The middleware wraps
+routing, dependency resolution, the handler, validation and serialization.
+Requests without the flag pass straight through, and profiling is disabled
+entirely while PROFILE_TOKEN is unset.
+
+The sampler snapshots every non-idle thread (the event loop and threadpool
+workers), so work from concurrent requests can show up in the profile too.
+"""
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+from urllib.parse import parse_qs
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from dotenv import load_dotenv
+
+from app.error_handlers import app_exception_handler
+from app.exceptions import ForbiddenError
+
+load_dotenv()
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_PARAM = "profile"
+
+# Leaf frames in these modules mean the thread is parked, not working
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+
+class Sampler(threading.Thread):
+    """Background thread sampling the stacks of all busy threads"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.samples: dict[int, list[tuple[float, tuple]]] = defaultdict(list)
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                self.samples[thread_id].append((now, _stack(frame)))
+
+    def __enter__(self) -> "Sampler":
+        self.started_at = time.perf_counter()
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop_event.set()
+        self.join()
+        self.stopped_at = time.perf_counter()
+
+    def to_speedscope(self, name: str) -> dict:
+        """Render the samples as a speedscope file, one profile per thread"""
+        frames: list[dict] = []
+        index: dict[tuple, int] = {}
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        profiles = []
+
+        for thread_id, samples in self.samples.items():
+            stacks, weights = [], []
+            previous = self.started_at
+            for at, stack in samples:
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    ids.append(index[frame])
+                stacks.append(ids)
+                weights.append(at - previous)
+                previous = at
+
+            profiles.append({
+                "type": "sampled",
+                "name": thread_names.get(thread_id, f"thread {thread_id}"),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.stopped_at - self.started_at,
+                "samples": stacks,
+                "weights": weights
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "student-room-api",
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+
+def _stack(frame) -> tuple:
+    """Root-to-leaf (function, file, line) tuples for a frame"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware, so unprofiled requests pay only a header lookup"""
+
+    def __init__(self, app: ASGIApp, token: Optional[str] = PROFILE_TOKEN):
+        self.app = app
+        self.token = token
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.token or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        supplied = _requested_token(scope)
+        if supplied is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not hmac.compare_digest(supplied, self.token):
+            response = await app_exception_handler(Request(scope), ForbiddenError("Invalid profiling token"))
+            await response(scope, receive, send)
+            return
+
+        status = {}
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        with Sampler() as sampler:
+            await self.app(scope, receive, capture)
+
+        name = f"{scope['method']} {scope['path']}"
+        response = Response(
+            content=json.dumps(sampler.to_speedscope(name)),
+            media_type="application/json",
+            headers={
+                "Content-Disposition": 'attachment; filename="profile.speedscope.json"',
+                "X-Profiled-Status": str(status.get("code", 500))
+            }
+        )
+        await response(scope, receive, send)
+
+
+def _requested_token(scope: Scope) -> Optional[str]:
+    """Profiling token from the header or query string, if any"""
+    for key, value in scope["headers"]:
+        if key == PROFILE_HEADER:
+            return value.decode("latin-1")
+
+    query = scope.get("query_string", b"")
+    if PROFILE_PARAM.encode() in query:
+        values = parse_qs(query.decode("latin-1")).get(PROFILE_PARAM)
+        if values:
+            return values[0]
+    return None
@@ -0,0 +1,267 @@
+"""
+Per-client token-bucket rate limiting
+
+Every API request takes tokens from its client's bucket, where the client is
+the API key in RATE_LIMIT_KEY_HEADER or, without one, the remote address.
+Requests cost what they roughly cost the database: point lookups 1, lists
+and stats more (RATE_LIMIT_COSTS), and a list without any filters
+RATE_LIMIT_UNFILTERED_FACTOR times its listed cost. Routes in
+RATE_LIMIT_ROUTES additionally get their own bucket per client, so a client
+can't spend its whole allowance on roster syncs.
+
+Buckets live in a fixed-size hash table in a memory-mapped file
+(RATE_LIMIT_FILE, in /dev/shm where available), locked with flock, so all
+uvicorn workers on a host share the same limits. A request that would
+overdraw a bucket is rejected with 429 and a Retry-After header.
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from dotenv import load_dotenv
+
+from app.exceptions import RateLimitExceededError
+
+load_dotenv()
+
+
+def _parse_routes(spec: str) -> dict[str, str]:
+    """'METHOD /path=value, ...' as {'METHOD /path': 'value'}"""
+    routes = {}
+    for item in spec.split(","):
+        route, _, value = item.rpartition("=")
+        if route.strip():
+            routes[" ".join(route.split())] = value.strip()
+    return routes
+
+
+def _parse_limit(value: str) -> tuple[float, float]:
+    """'burst/seconds' as (tokens per second, burst)"""
+    burst, _, seconds = value.partition("/")
+    return float(burst) / float(seconds or 1), float(burst)
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Sustained cost units per second and burst size of each client's bucket
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "50"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "200"))
+RATE_LIMIT_KEY_HEADER = os.getenv("RATE_LIMIT_KEY_HEADER", "X-API-Key")
+RATE_LIMIT_COSTS = {
+    route: float(cost) for route, cost in _parse_routes(os.getenv(
+        "RATE_LIMIT_COSTS",
+        "GET /api/v1/students/=2, GET /api/v1/students/changes=2, GET /api/v1/rooms/=2, "
+        "GET /api/v1/rooms/{room_id}/students=2, GET /api/v1/stats/=5, POST /api/v1/rooms/auto-assign=10, "
+        "POST /api/v1/students/archive=50, POST /api/v1/students/sync=50"
+    )).items()
+}
+RATE_LIMIT_UNFILTERED_FACTOR = float(os.getenv("RATE_LIMIT_UNFILTERED_FACTOR", "3"))
+# Per-client limits of single routes, as burst/seconds
+RATE_LIMIT_ROUTES = {
+    route: _parse_limit(limit) for route, limit in _parse_routes(os.getenv(
+        "RATE_LIMIT_ROUTES",
+        "POST /api/v1/students/sync=2/60, POST /api/v1/students/archive=2/60"
+    )).items()
+}
+RATE_LIMIT_FILE = os.getenv(
+    "RATE_LIMIT_FILE",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "student-room-ratelimit")
+)
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+
+# Query parameters that make a list a filtered one; lists without any are unbounded scans
+LIST_FILTERS = {
+    "GET /api/v1/students/": frozenset({"name", "sex", "room_id", "has_room", "born_after", "born_before"}),
+}
+
+_MAGIC = b"RLB1"
+_HEADER = struct.Struct("<4sI")
+# key hash (0 = empty), tokens, last refill (unix time)
+_SLOT = struct.Struct("<Qdd")
+# Slots searched for a key before the stalest one is reused
+_PROBES = 8
+
+
+class BucketTable:
+    """
+    Token buckets in a memory-mapped open-addressing hash table.
+
+    A slot holds a key hash, a token count and the time the bucket was last
+    refilled. When all probe slots of a key are taken, the one idle longest is
+    reused: a bucket idle for burst/rate seconds is full again anyway, so
+    evicting it only forgets a full bucket.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_FILE, slots: int = RATE_LIMIT_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.size = _HEADER.size + slots * _SLOT.size
+        self._lock = threading.Lock()
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._pid: Optional[int] = None
+
+    def take(self, buckets: list[tuple[str, float, float, float]], now: Optional[float] = None) -> float:
+        """
+        Take cost tokens from every (key, rate, burst, cost) bucket, or from none.
+
+        Returns 0 when the request may proceed, otherwise the seconds until the
+        emptiest bucket holds enough tokens.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            mapped = self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                updates = []
+                wait = 0.0
+                for key, rate, burst, cost in buckets:
+                    key_hash = _hash(key)
+                    offset, tokens, refilled = self._find(mapped, key_hash, [update[0] for update in updates])
+                    if refilled:
+                        tokens = min(burst, tokens + max(now - refilled, 0.0) * rate)
+                    else:
+                        tokens = burst
+                    # A cost above the burst could never be paid; charge a full bucket instead
+                    cost = min(cost, burst)
+                    if tokens < cost:
+                        wait = max(wait, (cost - tokens) / rate)
+                    updates.append((offset, key_hash, tokens, cost))
+
+                for offset, key_hash, tokens, cost in updates:
+                    _SLOT.pack_into(mapped, offset, key_hash, tokens if wait else tokens - cost, now)
+                return wait
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+                self._map = self._file = None
+
+    def _open(self) -> mmap.mmap:
+        """Map the table file, creating or resizing it; reopened after a fork"""
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+
+        self._file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), "r+b")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            self._file.seek(0)
+            header = self._file.read(_HEADER.size)
+            if os.fstat(self._file.fileno()).st_size != self.size or header != _HEADER.pack(_MAGIC, self.slots):
+                self._file.truncate(0)
+                self._file.truncate(self.size)
+                self._file.seek(0)
+                self._file.write(_HEADER.pack(_MAGIC, self.slots))
+                self._file.flush()
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), self.size)
+        self._pid = os.getpid()
+        return self._map
+
+    def _find(self, mapped: mmap.mmap, key_hash: int, claimed: list[int]) -> tuple[int, float, float]:
+        """Offset, tokens and refill time of key_hash's slot (a new bucket has refill time 0)"""
+        start = key_hash % self.slots
+        victim, victim_refilled = None, math.inf
+        for probe in range(_PROBES):
+            offset = _HEADER.size + ((start + probe) % self.slots) * _SLOT.size
+            if offset in claimed:
+                continue
+            stored_hash, tokens, refilled = _SLOT.unpack_from(mapped, offset)
+            if stored_hash == key_hash:
+                return offset, tokens, refilled
+            if stored_hash == 0:
+                return offset, 0.0, 0.0
+            if refilled < victim_refilled:
+                victim, victim_refilled = offset, refilled
+        return victim, 0.0, 0.0
+
+
+def _hash(key: str) -> int:
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class RateLimiter:
+    """Works out a request's client, cost and buckets and charges them"""
+
+    def __init__(
+            self,
+            table: BucketTable,
+            rate: float = RATE_LIMIT_RATE,
+            burst: float = RATE_LIMIT_BURST,
+            costs: Optional[dict[str, float]] = None,
+            routes: Optional[dict[str, tuple[float, float]]] = None,
+            unfiltered_factor: float = RATE_LIMIT_UNFILTERED_FACTOR
+    ):
+        self.table = table
+        self.rate = rate
+        self.burst = burst
+        self.costs = RATE_LIMIT_COSTS if costs is None else costs
+        self.routes = RATE_LIMIT_ROUTES if routes is None else routes
+        self.unfiltered_factor = unfiltered_factor
+        self.allowed = 0
+        self.limited = 0
+
+    def client(self, request: Request) -> str:
+        """API key when the request carries one, else the remote address"""
+        api_key = request.headers.get(RATE_LIMIT_KEY_HEADER)
+        if api_key:
+            return "key:" + hashlib.blake2b(api_key.encode(), digest_size=16).hexdigest()
+        return "ip:" + (request.client.host if request.client else "unknown")
+
+    def cost(self, route: str, request: Request) -> float:
+        """Tokens a request to route costs"""
+        cost = self.costs.get(route, 1.0)
+        filters = LIST_FILTERS.get(route)
+        if filters is not None and filters.isdisjoint(request.query_params.keys()):
+            cost *= self.unfiltered_factor
+        return cost
+
+    def check(self, request: Request) -> None:
+        """Charge the request to its client, raising RateLimitExceededError when over the limit"""
+        route = _route_name(request)
+        client = self.client(request)
+        cost = self.cost(route, request)
+        buckets = [(client, self.rate, self.burst, cost)]
+        if route in self.routes:
+            rate, burst = self.routes[route]
+            buckets.append((f"{client} {route}", rate, burst, 1.0))
+
+        wait = self.table.take(buckets)
+        if wait:
+            self.limited += 1
+            raise RateLimitExceededError(math.ceil(wait))
+        self.allowed += 1
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint (this worker only)"""
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "allowed": self.allowed,
+            "limited": self.limited
+        }
+
+
+def _route_name(request: Request) -> str:
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+rate_limiter = RateLimiter(BucketTable())
+
+
+async def rate_limit(request: Request) -> None:
+    """Router dependency enforcing the per-client rate limits"""
+    if RATE_LIMIT_ENABLED:
+        rate_limiter.check(request)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.jobs import job_runner, get_job as get_job_by_id
+from app.schemas import JobResponse, ErrorResponse
+
+router = APIRouter()
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobResponse,
+    summary="Get job by ID",
+    description="Retrieve the status, progress and result of a background job",
+    responses={
+        404: {"model": ErrorResponse, "description": "Job not found"}
+    }
+)
+async def get_job(
+        job_id: str,
+        db: Session = Depends(get_db)
+):
+    """Get a background job by ID"""
+    return get_job_by_id(db, job_id)
+
+
+@router.delete(
+    "/{job_id}",
+    response_model=JobResponse,
+    summary="Cancel job",
+    description="Cancel a queued job, or ask a running job to stop (its changes are rolled back)",
+    responses={
+        404: {"model": ErrorResponse, "description": "Job not found"}
+    }
+)
+async def cancel_job(
+        job_id: str
+):
+    """Cancel a background job"""
+    return job_runner.cancel(job_id)
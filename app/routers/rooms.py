@@ -1,59 +1,109 @@
+import os
+from typing import Optional, Union
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
+from app.singleflight import coalesced_json
+from app.jobs import job_runner
 import app.cruds as crud
 from app.schemas import (
     RoomCreate,
     RoomUpdate,
     RoomResponse,
+    RoomIncludeEnum,
+    RoomWithStudentsResponse,
     StudentResponse,
+    AutoAssignRequest,
+    AutoAssignResponse,
+    RoomAssignment,
+    JobResponse,
     ErrorResponse,
     PaginatedResponse
 )
 
 router = APIRouter()
 
+INCLUDE_STUDENTS_LIMIT = int(os.getenv("INCLUDE_STUDENTS_LIMIT", "20"))
+INCLUDE_STUDENTS_MAX_LIMIT = int(os.getenv("INCLUDE_STUDENTS_MAX_LIMIT", "100"))
+
+
+def _with_students(room, counts: dict[int, int]) -> RoomWithStudentsResponse:
+    return RoomWithStudentsResponse(
+        room_id=room.room_id,
+        name=room.name,
+        capacity=room.capacity,
+        students=room.students,
+        student_count=counts[room.room_id]
+    )
+
 
 @router.get(
     "/",
-    response_model=PaginatedResponse[RoomResponse],
+    response_model=Union[PaginatedResponse[RoomWithStudentsResponse], PaginatedResponse[RoomResponse]],
     summary="Get all rooms",
-    description="Retrieve all rooms with pagination metadata"
+    description="Retrieve all rooms with pagination metadata; include=students embeds each room's students"
 )
 async def get_rooms(
         skip: int = Query(0, ge=0, description="Number of rooms to skip"),
         limit: int = Query(10, ge=1, le=100, description="Maximum number of rooms to return"),
-        db: Session = Depends(get_db)
+        include: Optional[RoomIncludeEnum] = Query(None, description="Related data to embed"),
+        students_limit: int = Query(
+            INCLUDE_STUDENTS_LIMIT, ge=0, le=INCLUDE_STUDENTS_MAX_LIMIT,
+            description="Maximum number of students embedded per room"
+        )
 ):
     """Get all rooms with pagination metadata"""
 
-    rooms = crud.get_rooms(db, skip=skip, limit=limit)
+    def build(db: Session):
+        # Embedding students needs ORM rooms; a plain page is only serialized
+        include_students = include == RoomIncludeEnum.STUDENTS
+        rooms = crud.get_rooms(db, skip=skip, limit=limit, as_records=not include_students)
 
-    total = crud.count_rooms_filtered(db)
+        total = crud.count_rooms_filtered(db)
 
-    pages = (total + limit - 1) // limit if total > 0 else 0
-    page = (skip // limit) + 1
+        pages = (total + limit - 1) // limit if total > 0 else 0
+        page = (skip // limit) + 1
 
-    return PaginatedResponse[RoomResponse](
-        data=rooms,
-        total=total,
-        page=page,
-        size=limit,
-        pages=pages
-    )
+        if include_students:
+            counts = crud.load_room_students(db, rooms, students_limit)
+            return PaginatedResponse[RoomWithStudentsResponse](
+                data=[_with_students(room, counts) for room in rooms],
+                total=total,
+                page=page,
+                size=limit,
+                pages=pages
+            )
+
+        return PaginatedResponse[RoomResponse](
+            data=rooms,
+            total=total,
+            page=page,
+            size=limit,
+            pages=pages
+        )
+
+    key = ("rooms.list", skip, limit, include, students_limit if include else None)
+    return await coalesced_json(key, build)
 
 
 @router.get(
     "/{room_id}",
-    response_model=RoomResponse,
+    response_model=Union[RoomWithStudentsResponse, RoomResponse],
     summary="Get room by ID",
-    description="Retrieve a specific room by ID",
+    description="Retrieve a specific room by ID; include=students embeds its students",
     responses={
         404: {"model": ErrorResponse, "description": "Room not found"}
     }
 )
 async def get_room(
         room_id: int,
+        include: Optional[RoomIncludeEnum] = Query(None, description="Related data to embed"),
+        students_limit: int = Query(
+            INCLUDE_STUDENTS_LIMIT, ge=0, le=INCLUDE_STUDENTS_MAX_LIMIT,
+            description="Maximum number of students embedded"
+        ),
         db: Session = Depends(get_db)
 ):
     """Get a specific room by ID"""
@@ -61,6 +111,9 @@ async def get_room(
     if not room:
         from app.exceptions import RoomNotFoundError
         raise RoomNotFoundError(room_id)
+
+    if include == RoomIncludeEnum.STUDENTS:
+        return _with_students(room, crud.load_room_students(db, [room], students_limit))
     return room
 
 
@@ -76,29 +129,31 @@ async def get_room(
 async def get_students_in_room(
         room_id: int,
         skip: int = Query(0, ge=0, description="Number of students to skip"),
-        limit: int = Query(10, ge=1, le=100, description="Maximum number of students to return"),
-        db: Session = Depends(get_db)
+        limit: int = Query(10, ge=1, le=100, description="Maximum number of students to return")
 ):
     """Get all students in a specific room with pagination metadata"""
-    if not crud.room_exists(db, room_id):
-        from app.exceptions import RoomNotFoundError
-        raise RoomNotFoundError(room_id)
 
-    all_students = crud.get_students_in_room(db, room_id)
-    total = len(all_students)
+    def build(db: Session):
+        if not crud.room_exists(db, room_id):
+            from app.exceptions import RoomNotFoundError
+            raise RoomNotFoundError(room_id)
 
-    students = all_students[skip:skip + limit]
+        students = crud.get_students_in_room(db, room_id, skip=skip, limit=limit, as_records=True)
+        total = crud.count_students_in_room(db, room_id)
 
-    pages = (total + limit - 1) // limit if total > 0 else 0
-    page = (skip // limit) + 1
+        pages = (total + limit - 1) // limit if total > 0 else 0
+        page = (skip // limit) + 1
 
-    return PaginatedResponse[StudentResponse](
-        data=students,
-        total=total,
-        page=page,
-        size=limit,
-        pages=pages
-    )
+        return PaginatedResponse[StudentResponse](
+            data=students,
+            total=total,
+            page=page,
+            size=limit,
+            pages=pages
+        )
+
+    key = ("rooms.students", room_id, skip, limit)
+    return await coalesced_json(key, build)
 
 
 @router.post(
@@ -121,7 +176,45 @@ async def create_room(
     return crud.create_room(
         db=db,
         room_id=room.room_id,
-        name=room.name
+        name=room.name,
+        capacity=room.capacity
+    )
+
+
+@router.post(
+    "/auto-assign",
+    response_model=AutoAssignResponse,
+    summary="Auto-assign students to rooms",
+    description="Assign every unassigned student (optionally filtered by sex or birth year) "
+                "to rooms with free capacity",
+    responses={
+        202: {"model": JobResponse, "description": "Queued as a background job"},
+        422: {"model": ErrorResponse, "description": "Validation error"},
+        503: {"model": ErrorResponse, "description": "Job queue is full"}
+    }
+)
+async def auto_assign_students(
+        request: AutoAssignRequest,
+        background: bool = Query(False, description="Run as a background job and return 202 with the job"),
+        db: Session = Depends(get_db)
+):
+    """Bulk-assign unassigned students to rooms with free capacity"""
+    if background:
+        job = job_runner.submit("auto_assign", request.model_dump(mode="json"))
+        return JSONResponse(status_code=202, content=JobResponse.model_validate(job).model_dump(mode="json"))
+
+    assigned, remaining, counts = await run_in_threadpool(
+        crud.auto_assign_students,
+        db=db,
+        strategy=request.strategy,
+        sex=request.sex,
+        birth_year=request.birth_year
+    )
+
+    return AutoAssignResponse(
+        assigned=assigned,
+        remaining=remaining,
+        rooms=[RoomAssignment(room_id=room_id, assigned=count) for room_id, count in sorted(counts.items())]
     )
 
 
@@ -129,8 +222,9 @@ async def create_room(
     "/{room_id}",
     response_model=RoomResponse,
     summary="Update room",
-    description="Update an existing room",
+    description="Update an existing room; capacity can't be set below the number of students already in it",
     responses={
+        400: {"model": ErrorResponse, "description": "Capacity below the room's current number of students"},
         404: {"model": ErrorResponse, "description": "Room not found"},
         422: {"model": ErrorResponse, "description": "Validation error"}
     }
@@ -141,10 +235,12 @@ async def update_room(
         db: Session = Depends(get_db)
 ):
     """Update an existing room"""
+    # Only a capacity the client sent (null included) replaces the current one
     return crud.update_room(
         db=db,
         room_id=room_id,
-        name=room_update.name
+        name=room_update.name,
+        **room_update.model_dump(include={"capacity"}, exclude_unset=True)
     )
 
 
@@ -0,0 +1,29 @@
+import os
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.cache import ResultCache
+import app.cruds as crud
+from app.schemas import StatsResponse
+
+router = APIRouter()
+
+stats_cache = ResultCache(ttl=float(os.getenv("STATS_CACHE_TTL", "60")), maxsize=1)
+
+
+@router.get(
+    "/",
+    response_model=StatsResponse,
+    summary="Get roster statistics",
+    description="Age distribution, sex ratio per room and assigned vs unassigned counts "
+                "(cached, invalidated by writes)"
+)
+async def get_stats(
+        db: Session = Depends(get_db)
+):
+    """Get roster statistics"""
+    return stats_cache.get_or_compute(
+        "stats",
+        ("Students", "Rooms"),
+        lambda: crud.get_roster_stats(db)
+    )
@@ -1,14 +1,31 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, Query
+from datetime import date, datetime
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
+from app.singleflight import coalesced_json
+from app.jobs import job_runner, spool_path
+from app.group_commit import group_commit
+from app.snapshot import student_snapshot, STUDENT_SNAPSHOT_ENABLED
+from app.autocomplete import name_index
 import app.cruds as crud
 from app.schemas import (
     StudentCreate,
     StudentUpdate,
     StudentResponse,
+    StudentStatusResponse,
     StudentWithRoomResponse,
     StudentMoveRequest,
+    StudentChangesResponse,
+    StudentSuggestion,
+    SyncSummary,
+    ArchiveSummary,
+    JobResponse,
+    StudentIncludeEnum,
+    StudentSortEnum,
+    SortOrderEnum,
     SexEnum,
     ErrorResponse,
     PaginatedResponse
@@ -16,12 +33,20 @@ from app.schemas import (
 
 router = APIRouter()
 
+SYNC_CHUNK_SIZE = 5000
+
 
 @router.get(
     "/",
-    response_model=PaginatedResponse[StudentResponse],
+    response_model=Union[
+        PaginatedResponse[StudentWithRoomResponse],
+        PaginatedResponse[StudentStatusResponse],
+        PaginatedResponse[StudentResponse]
+    ],
     summary="Get all students",
-    description="Retrieve all students with optional filtering and pagination metadata"
+    description="Retrieve all students with optional filtering, sorting and pagination metadata; "
+                "include=room embeds each student's room and include_archived=true adds graduated "
+                "students from the archive"
 )
 async def get_students(
     skip: int = Query(0, ge=0, description="Number of students to skip"),
@@ -30,55 +55,146 @@ async def get_students(
     sex: Optional[SexEnum] = Query(None, description="Filter by sex (M or F)"),
     room_id: Optional[int] = Query(None, gt=0, description="Filter by room ID"),
     has_room: Optional[bool] = Query(None, description="Filter students with/without room assignment"),
-    db: Session = Depends(get_db)
+    born_after: Optional[date] = Query(None, description="Filter students born on or after this date"),
+    born_before: Optional[date] = Query(None, description="Filter students born on or before this date"),
+    sort: StudentSortEnum = Query(StudentSortEnum.STUDENT_ID, description="Field to sort by"),
+    order: SortOrderEnum = Query(SortOrderEnum.ASC, description="Sort direction"),
+    include: Optional[StudentIncludeEnum] = Query(None, description="Related data to embed"),
+    include_archived: bool = Query(False, description="Also search students moved to the archive")
 ):
-    """Get all students with optional filtering and pagination metadata"""
+    """Get all students with optional filtering, sorting and pagination metadata"""
+    include_room = include == StudentIncludeEnum.ROOM
 
-    students = crud.get_students(
-        db=db,
-        skip=skip,
-        limit=limit,
-        name=name,
-        sex=sex,
-        room_id=room_id,
-        has_room=has_room
-    )
+    def build(db: Session):
+        result = None
+        if STUDENT_SNAPSHOT_ENABLED and not include_room and not include_archived:
+            result = student_snapshot.query(
+                db,
+                skip=skip,
+                limit=limit,
+                name=name,
+                sex=sex,
+                room_id=room_id,
+                has_room=has_room,
+                born_after=born_after,
+                born_before=born_before,
+                sort=sort,
+                order=order
+            )
 
-    total = crud.count_students_filtered(
-        db=db,
-        name=name,
-        sex=sex,
-        room_id=room_id,
-        has_room=has_room
+        if result is not None:
+            students, total = result
+        else:
+            filters = dict(
+                name=name,
+                sex=sex,
+                room_id=room_id,
+                has_room=has_room,
+                born_after=born_after,
+                born_before=born_before
+            )
+            if include_archived:
+                students = crud.get_students_with_archived(
+                    db=db, skip=skip, limit=limit, sort=sort, order=order, include_room=include_room, **filters
+                )
+                total = crud.count_students_filtered(db=db, **filters)
+                total += crud.count_archived_students_filtered(db=db, **filters)
+            else:
+                # Plain pages are only serialized, so skip ORM instances for them
+                students = crud.get_students(
+                    db=db, skip=skip, limit=limit, sort=sort, order=order,
+                    include_room=include_room, as_records=not include_room, **filters
+                )
+                total = crud.count_students_filtered(db=db, **filters)
+
+        pages = (total + limit - 1) // limit if total > 0 else 0
+        page = (skip // limit) + 1
+
+        if include_room:
+            response_model = StudentWithRoomResponse
+        elif include_archived:
+            response_model = StudentStatusResponse
+        else:
+            response_model = StudentResponse
+        return PaginatedResponse[response_model](
+            data=students,
+            total=total,
+            page=page,
+            size=limit,
+            pages=pages
+        )
+
+    key = (
+        "students.list", skip, limit, name, sex, room_id, has_room, born_after, born_before,
+        sort, order, include, include_archived
     )
+    return await coalesced_json(key, build)
 
-    pages = (total + limit - 1) // limit if total > 0 else 0
-    page = (skip // limit) + 1
 
-    return PaginatedResponse[StudentResponse](
-        data=students,
-        total=total,
-        page=page,
-        size=limit,
-        pages=pages
+@router.get(
+    "/changes",
+    response_model=StudentChangesResponse,
+    summary="Get student changes",
+    description="Incremental delta sync: students inserted, updated, deleted or archived after a change token",
+    responses={
+        422: {"model": ErrorResponse, "description": "Invalid change token"}
+    }
+)
+async def get_student_changes(
+    since: Optional[str] = Query(None, description="Change token from a previous call (omit for a full sync)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes to return"),
+    db: Session = Depends(get_db)
+):
+    """Get students changed since the given token"""
+    changes, next_token = crud.get_student_changes(db, since=since, limit=limit)
+
+    return StudentChangesResponse(
+        changes=changes,
+        next_token=next_token,
+        has_more=len(changes) == limit
     )
 
 
+@router.get(
+    "/autocomplete",
+    response_model=List[StudentSuggestion],
+    summary="Autocomplete student names",
+    description="Students with a name word starting with q (case- and accent-insensitive), "
+                "served from an in-memory index"
+)
+async def autocomplete_students(
+    q: str = Query(..., min_length=1, max_length=50, description="Typed prefix"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of suggestions"),
+):
+    """Suggest students whose name matches the typed prefix"""
+    if name_index.stale:
+        await run_in_threadpool(name_index.refresh)
+
+    return JSONResponse(content=[
+        {"student_id": student_id, "name": name}
+        for student_id, name in name_index.search(q, limit)
+    ])
+
+
 @router.get(
     "/{student_id}",
     response_model=StudentWithRoomResponse,
     summary="Get student by ID",
-    description="Retrieve a specific student by ID with room information",
+    description="Retrieve a specific student by ID with room information; include_archived=true "
+                "also looks in the archive",
     responses={
         404: {"model": ErrorResponse, "description": "Student not found"}
     }
 )
 async def get_student(
     student_id: int,
+    include_archived: bool = Query(False, description="Also look for the student in the archive"),
     db: Session = Depends(get_db)
 ):
     """Get a specific student by ID with room information"""
     student = crud.get_student_with_room(db, student_id)
+    if not student and include_archived:
+        student = crud.get_archived_student(db, student_id)
     if not student:
         from app.exceptions import StudentNotFoundError
         raise StudentNotFoundError(student_id)
@@ -103,6 +219,17 @@ async def create_student(
     db: Session = Depends(get_db)
 ):
     """Create a new student"""
+    if group_commit.enabled:
+        return await group_commit.submit(lambda batch_db: crud.create_student(
+            db=batch_db,
+            student_id=student.student_id,
+            name=student.name,
+            birthday=student.birthday,
+            sex=student.sex,
+            room_id=student.room_id,
+            commit=False
+        ))
+
     return crud.create_student(
         db=db,
         student_id=student.student_id,
@@ -113,6 +240,97 @@ async def create_student(
     )
 
 
+@router.post(
+    "/sync",
+    response_model=SyncSummary,
+    summary="Sync full roster",
+    description="Reconcile students with an authoritative roster streamed as NDJSON "
+                "(one student object per line). Only differences are written; students "
+                "missing from the roster are deleted.",
+    responses={
+        202: {"model": JobResponse, "description": "Queued as a background job"},
+        400: {"model": ErrorResponse, "description": "Invalid room assignment or room over capacity"},
+        422: {"model": ErrorResponse, "description": "Invalid or duplicate roster line"},
+        503: {"model": ErrorResponse, "description": "Job queue is full"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/StudentCreate"}
+                }
+            }
+        }
+    }
+)
+async def sync_students(
+    request: Request,
+    background: bool = Query(False, description="Run as a background job and return 202 with the job"),
+    db: Session = Depends(get_db)
+):
+    """Reconcile the students table with a streamed roster"""
+    if background:
+        # Spool the body so the job (and a resumed job after restart) can read it
+        path = spool_path()
+        with open(path, "wb") as spool:
+            async for chunk in request.stream():
+                spool.write(chunk)
+        job = job_runner.submit("roster_sync", {"path": path})
+        return JSONResponse(status_code=202, content=JobResponse.model_validate(job).model_dump(mode="json"))
+
+    sync = await run_in_threadpool(crud.StudentSync, db)
+    batch: list[StudentCreate] = []
+    buffer = b""
+    line_number = 0
+
+    def parse(line: bytes) -> None:
+        nonlocal line_number
+        line_number += 1
+        student = crud.parse_roster_line(line, line_number)
+        if student is not None:
+            batch.append(student)
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+        if len(batch) >= SYNC_CHUNK_SIZE:
+            await run_in_threadpool(sync.apply, batch)
+            batch = []
+
+    parse(buffer)
+    await run_in_threadpool(sync.apply, batch)
+    return await run_in_threadpool(sync.finish)
+
+
+@router.post(
+    "/archive",
+    response_model=ArchiveSummary,
+    summary="Archive graduated students",
+    description="Move students who graduated before the given time (default: now) out of the "
+                "students table into the archive, in small batches",
+    responses={
+        202: {"model": JobResponse, "description": "Queued as a background job"},
+        503: {"model": ErrorResponse, "description": "Job queue is full"}
+    }
+)
+async def archive_students(
+    graduated_before: Optional[datetime] = Query(None, description="Only archive students graduated before this time"),
+    background: bool = Query(False, description="Run as a background job and return 202 with the job"),
+    db: Session = Depends(get_db)
+):
+    """Move graduated students to the archive"""
+    if background:
+        params = {"graduated_before": graduated_before.isoformat() if graduated_before else None}
+        job = job_runner.submit("archive_students", params)
+        return JSONResponse(status_code=202, content=JobResponse.model_validate(job).model_dump(mode="json"))
+
+    archived = await run_in_threadpool(crud.archive_graduated_students, db, graduated_before)
+    return ArchiveSummary(archived=archived)
+
+
 @router.put(
     "/{student_id}",
     response_model=StudentResponse,
@@ -173,4 +391,26 @@ async def move_student(
     db: Session = Depends(get_db)
 ):
     """Move a student to a different room or unassign from room"""
-    return crud.move_student(db, student_id, move_request.room_id)
\ No newline at end of file
+    if group_commit.enabled:
+        return await group_commit.submit(
+            lambda batch_db: crud.move_student(batch_db, student_id, move_request.room_id, commit=False)
+        )
+
+    return crud.move_student(db, student_id, move_request.room_id)
+
+
+@router.post(
+    "/{student_id}/graduate",
+    response_model=StudentStatusResponse,
+    summary="Graduate student",
+    description="Mark a student as graduated; the next archive run moves them to the archive",
+    responses={
+        404: {"model": ErrorResponse, "description": "Student not found"}
+    }
+)
+async def graduate_student(
+    student_id: int,
+    db: Session = Depends(get_db)
+):
+    """Mark a student as graduated"""
+    return crud.graduate_student(db, student_id)
@@ -2,22 +2,47 @@
 Schemas package - centralized imports
 """
 
-from .base import SexEnum, ErrorResponse
+from .base import SexEnum, SortOrderEnum, ErrorResponse
 
 from .room import (
     RoomBase,
     RoomCreate,
     RoomUpdate,
-    RoomResponse
+    RoomResponse,
+    RoomIncludeEnum,
+    AssignStrategyEnum,
+    AutoAssignRequest,
+    RoomAssignment,
+    AutoAssignResponse
 )
 
 from .student import (
+    StudentIncludeEnum,
+    StudentSortEnum,
     StudentBase,
     StudentCreate,
     StudentUpdate,
     StudentMoveRequest,
     StudentResponse,
-    StudentWithRoomResponse
+    StudentStatusResponse,
+    StudentWithRoomResponse,
+    RoomWithStudentsResponse,
+    StudentSuggestion,
+    StudentChange,
+    StudentChangesResponse,
+    SyncSummary,
+    ArchiveSummary
+)
+
+from .job import (
+    JobStatusEnum,
+    JobResponse
+)
+
+from .stats import (
+    AgeBucket,
+    RoomSexRatio,
+    StatsResponse
 )
 
 from .pagination import (
@@ -27,19 +52,39 @@ from .pagination import (
 
 __all__ = [
     "SexEnum",
+    "SortOrderEnum",
     "ErrorResponse",
 
     "RoomBase",
     "RoomCreate",
     "RoomUpdate",
     "RoomResponse",
+    "RoomIncludeEnum",
+    "AssignStrategyEnum",
+    "AutoAssignRequest",
+    "RoomAssignment",
+    "AutoAssignResponse",
 
+    "StudentIncludeEnum",
+    "StudentSortEnum",
     "StudentBase",
     "StudentCreate",
     "StudentUpdate",
     "StudentMoveRequest",
     "StudentResponse",
+    "StudentStatusResponse",
     "StudentWithRoomResponse",
+    "RoomWithStudentsResponse",
+    "StudentSuggestion",
+    "StudentChange",
+    "StudentChangesResponse",
+    "SyncSummary",
+    "ArchiveSummary",
+    "JobStatusEnum",
+    "JobResponse",
+    "AgeBucket",
+    "RoomSexRatio",
+    "StatsResponse",
     "PaginationParams",
     "PaginatedResponse"
 ]
@@ -8,6 +8,12 @@ class SexEnum(str, Enum):
     F = "F"
 
 
+class SortOrderEnum(str, Enum):
+    """Sort direction"""
+    ASC = "asc"
+    DESC = "desc"
+
+
 class ErrorResponse(BaseModel):
     """Standard error response"""
     error: str
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from typing import Any, Optional
+from datetime import datetime
+from enum import Enum
+
+
+class JobStatusEnum(str, Enum):
+    """Background job status"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: JobStatusEnum
+    progress: float = Field(..., ge=0, le=1, description="Fraction of the work done")
+    result: Optional[Any] = Field(None, description="Operation result once the job has succeeded")
+    error: Optional[str] = Field(None, description="Failure reason once the job has failed")
+    cancel_requested: bool
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
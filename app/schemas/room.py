@@ -1,9 +1,13 @@
 from pydantic import BaseModel, Field
+from typing import List, Optional
+from enum import Enum
+from .base import SexEnum
 
 
 class RoomBase(BaseModel):
     room_id: int = Field(..., gt=0)
     name: str = Field(..., min_length=1, max_length=50)
+    capacity: Optional[int] = Field(None, ge=0, description="Maximum number of students (no limit if omitted)")
 
 
 class RoomCreate(RoomBase):
@@ -12,8 +16,43 @@ class RoomCreate(RoomBase):
 
 class RoomUpdate(BaseModel):
     name: str = Field(..., min_length=1, max_length=50)
+    capacity: Optional[int] = Field(
+        None, ge=0, description="Maximum number of students; null removes the limit, omitting it keeps the current one"
+    )
 
 
 class RoomResponse(RoomBase):
     class Config:
         from_attributes = True
+
+
+class RoomIncludeEnum(str, Enum):
+    """Relations that can be expanded on room reads"""
+    STUDENTS = "students"
+
+
+class AssignStrategyEnum(str, Enum):
+    """Room auto-assignment strategy"""
+    GREEDY = "greedy"
+    BALANCED = "balanced"
+
+
+class AutoAssignRequest(BaseModel):
+    strategy: AssignStrategyEnum = Field(
+        AssignStrategyEnum.BALANCED,
+        description="greedy fills rooms in ID order, balanced spreads students over the emptiest rooms"
+    )
+    sex: Optional[SexEnum] = Field(None, description="Only assign students of this sex")
+    birth_year: Optional[int] = Field(None, ge=1900, le=2100, description="Only assign students born in this year")
+
+
+class RoomAssignment(BaseModel):
+    room_id: int
+    assigned: int
+
+
+class AutoAssignResponse(BaseModel):
+    """Summary of an auto-assignment run"""
+    assigned: int = Field(..., description="Number of students assigned to a room")
+    remaining: int = Field(..., description="Matching students left unassigned for lack of capacity")
+    rooms: List[RoomAssignment] = Field(..., description="Students assigned per room")
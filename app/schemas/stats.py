@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List
+
+
+class AgeBucket(BaseModel):
+    birth_year: int
+    age: int = Field(..., description="Age reached in the current year")
+    count: int
+
+
+class RoomSexRatio(BaseModel):
+    room_id: int
+    male: int
+    female: int
+
+
+class StatsResponse(BaseModel):
+    """Roster statistics"""
+    total: int = Field(..., description="Total number of students")
+    assigned: int = Field(..., description="Students assigned to a room")
+    unassigned: int = Field(..., description="Students without a room")
+    sex: Dict[str, int] = Field(..., description="Student count per sex")
+    age_distribution: List[AgeBucket]
+    rooms: List[RoomSexRatio] = Field(..., description="Sex ratio per room")
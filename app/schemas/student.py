@@ -1,10 +1,23 @@
 from pydantic import BaseModel, Field
-from typing import Optional
-from datetime import date
+from typing import List, Optional
+from datetime import date, datetime
+from enum import Enum
 from .base import SexEnum
 from .room import RoomResponse
 
 
+class StudentIncludeEnum(str, Enum):
+    """Relations that can be expanded on student lists"""
+    ROOM = "room"
+
+
+class StudentSortEnum(str, Enum):
+    """Sortable student fields"""
+    NAME = "name"
+    BIRTHDAY = "birthday"
+    STUDENT_ID = "student_id"
+
+
 class StudentBase(BaseModel):
     student_id: int = Field(..., gt=0)
     name: str = Field(..., min_length=1, max_length=50)
@@ -33,8 +46,57 @@ class StudentResponse(StudentBase):
         from_attributes = True
 
 
-class StudentWithRoomResponse(StudentResponse):
+class StudentStatusResponse(StudentResponse):
+    """Student with graduation and archive status"""
+    graduated_at: Optional[datetime] = Field(None, description="When the student graduated")
+    archived: bool = Field(False, description="Whether the student has been moved to the archive")
+
+
+class StudentWithRoomResponse(StudentStatusResponse):
     room: Optional['RoomResponse'] = None
 
 
+class RoomWithStudentsResponse(RoomResponse):
+    """Room with its (possibly truncated) list of students"""
+    students: List[StudentResponse] = Field(..., description="Students in the room, by ID, up to the nested row cap")
+    student_count: int = Field(..., description="Total number of students in the room")
+
+
+class StudentSuggestion(BaseModel):
+    """Autocomplete match"""
+    student_id: int
+    name: str
+
+
+class StudentChange(StudentBase):
+    updated_at: datetime
+    graduated_at: Optional[datetime] = Field(None, description="When the student graduated")
+    deleted: bool = Field(False, description="Whether the student has been deleted or archived")
+    archived: bool = Field(False, description="Whether the student was moved to the archive")
+
+    class Config:
+        from_attributes = True
+
+
+class StudentChangesResponse(BaseModel):
+    """Delta sync page of student changes"""
+    changes: List[StudentChange] = Field(..., description="Changed students, oldest first")
+    next_token: Optional[str] = Field(None, description="Token to pass as 'since' on the next call")
+    has_more: bool = Field(..., description="Whether more changes are immediately available")
+
+
+class SyncSummary(BaseModel):
+    """Changes applied by a roster sync"""
+    inserted: int = Field(..., description="Students created (or revived)")
+    updated: int = Field(..., description="Students whose details changed")
+    moved: int = Field(..., description="Students whose only change was their room")
+    deleted: int = Field(..., description="Students missing from the roster")
+    unchanged: int = Field(..., description="Students left untouched")
+
+
+class ArchiveSummary(BaseModel):
+    """Result of an archive run"""
+    archived: int = Field(..., description="Graduated students moved to the archive")
+
+
 StudentWithRoomResponse.model_rebuild()
@@ -0,0 +1,89 @@
+"""
+Request coalescing (single-flight) for identical concurrent reads
+"""
+import asyncio
+import functools
+import os
+from typing import Any, Callable, Hashable
+from fastapi import Response
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+
+load_dotenv()
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls into one execution.
+
+    The first caller for a key (the leader) starts the function in the
+    threadpool; callers arriving with the same key while it is in flight await
+    the same result instead of running their own query. The call runs in a
+    task of its own, so a caller that is cancelled (say its client
+    disconnected) stops waiting without cancelling anyone else's result.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) once for all concurrent callers with the same key"""
+        if not self.enabled:
+            return await run_in_threadpool(fn, *args, **kwargs)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+            self._inflight[key] = task
+            self.executed += 1
+            task.add_done_callback(functools.partial(self._finished, key))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark as retrieved so a failure whose callers all went away doesn't warn
+            task.exception()
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        return {
+            "enabled": self.enabled,
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight)
+        }
+
+
+singleflight = SingleFlight(enabled=SINGLEFLIGHT_ENABLED)
+
+
+async def coalesced_json(key: Hashable, build: Callable[[Session], Any]) -> Response:
+    """
+    Build a pydantic response once per key and share its serialized body.
+
+    build(db) runs on a session of its own rather than the leader's
+    request-scoped one: the shared computation outlives a leader that is
+    cancelled, while the leader's session is closed as its request unwinds.
+    Each caller gets its own Response object wrapping the shared JSON bytes.
+    """
+    def run() -> bytes:
+        db = SessionLocal()
+        try:
+            return build(db).model_dump_json().encode()
+        finally:
+            db.close()
+
+    body = await singleflight.do(key, run)
+    return Response(content=body, media_type="application/json")
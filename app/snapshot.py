@@ -0,0 +1,264 @@
+"""
+In-memory columnar snapshot of students for filter-heavy reads
+
+Optional read engine, enabled with STUDENT_SNAPSHOT_ENABLED=true and only when
+NumPy is installed. Students are held as parallel arrays sorted by
+student_id, and list/count queries are answered with vectorized masks. The
+snapshot follows the delta sync change feed, so writes committed through
+app/cruds are applied incrementally; until the feed has caught up with the
+latest write, or whenever the snapshot can't be brought up to date, the
+caller falls back to SQL.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+import app.cruds as crud
+from app.cache import table_versions
+from app.database import shard_router
+from app.cruds.base import change_horizon, encode_change_token
+from app.models import Student, utcnow
+from app.schemas import SexEnum, SortOrderEnum, StudentSortEnum
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+load_dotenv()
+
+STUDENT_SNAPSHOT_ENABLED = os.getenv("STUDENT_SNAPSHOT_ENABLED", "false").lower() == "true"
+STUDENT_SNAPSHOT_MAX_AGE = float(os.getenv("STUDENT_SNAPSHOT_MAX_AGE", "5"))
+
+SEX_CODES = {SexEnum.M.value: 0, SexEnum.F.value: 1}
+SEX_VALUES = [SexEnum.M.value, SexEnum.F.value]
+NO_ROOM = -1
+
+# Versions the snapshot follows
+_TABLES = ("Students",)
+
+
+class _Columns(NamedTuple):
+    """One consistent copy of the arrays, replaced as a whole on every change"""
+    ids: "np.ndarray"
+    room_ids: "np.ndarray"
+    birthdays: "np.ndarray"
+    sex: "np.ndarray"
+    names: list[str]
+
+
+class StudentSnapshot:
+    """
+    Columnar copy of the active students.
+
+    Queries read whichever column set is current without locking; the lock
+    only serializes refreshes, which build new arrays and swap them in.
+    """
+
+    def __init__(self, max_age: float = STUDENT_SNAPSHOT_MAX_AGE, max_changes: int = 10000):
+        self.max_age = max_age
+        self.max_changes = max_changes
+        self._lock = threading.Lock()
+        self._columns: Optional[_Columns] = None
+        self._token: Optional[str] = None
+        self._version: tuple[int, ...] = ()
+        self._refreshed_at = 0.0
+        # Table version not yet covered by the feed, and when it was first seen
+        self._pending: Optional[tuple[tuple[int, ...], datetime]] = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    @property
+    def available(self) -> bool:
+        # The change feed is merged across shards, but the build isn't
+        return np is not None and not shard_router.enabled
+
+    def build(self, db: Session) -> None:
+        """Load the full snapshot with one streamed query"""
+        with self._lock:
+            self._build(db)
+
+    def query(
+            self,
+            db: Session,
+            skip: int = 0,
+            limit: int = 100,
+            name: Optional[str] = None,
+            sex: Optional[SexEnum] = None,
+            room_id: Optional[int] = None,
+            has_room: Optional[bool] = None,
+            born_after: Optional[date] = None,
+            born_before: Optional[date] = None,
+            sort: StudentSortEnum = StudentSortEnum.STUDENT_ID,
+            order: SortOrderEnum = SortOrderEnum.ASC
+    ) -> Optional[tuple[list[dict], int]]:
+        """
+        Answer a get_students/count_students_filtered query.
+
+        Returns (rows, total), or None when the snapshot can't serve the
+        request and the caller should use SQL instead. Name filters and
+        sorting by name are left to SQL, so the database collation decides
+        what matches (accents, ß vs ss) and in which order.
+        """
+        columns = None
+        if not name and sort != StudentSortEnum.NAME and self.available:
+            columns = self._fresh_columns(db)
+        if columns is None:
+            self.fallbacks += 1
+            return None
+
+        mask = np.ones(len(columns.ids), dtype=bool)
+        if sex:
+            mask &= columns.sex == SEX_CODES[SexEnum(sex).value]
+        if room_id:
+            mask &= columns.room_ids == room_id
+        if has_room is not None:
+            mask &= (columns.room_ids != NO_ROOM) if has_room else (columns.room_ids == NO_ROOM)
+        if born_after:
+            mask &= columns.birthdays >= born_after.toordinal()
+        if born_before:
+            mask &= columns.birthdays <= born_before.toordinal()
+
+        # Rows are stored by student_id, which also breaks birthday ties
+        matches = np.flatnonzero(mask)
+        if sort == StudentSortEnum.BIRTHDAY:
+            matches = matches[np.argsort(columns.birthdays[matches], kind="stable")]
+        if order == SortOrderEnum.DESC:
+            matches = matches[::-1]
+        page = matches[skip:skip + limit]
+        self.hits += 1
+        return [_row(columns, i) for i in page], len(matches)
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint"""
+        columns = self._columns
+        return {
+            "loaded": columns is not None,
+            "rows": len(columns.ids) if columns is not None else 0,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks
+        }
+
+    def _fresh_columns(self, db: Session) -> Optional[_Columns]:
+        """The current columns, refreshed first if needed; None to use SQL"""
+        # _version is written after _columns, so a matching version means
+        # the columns read next are at least that fresh
+        if table_versions(_TABLES) == self._version and time.monotonic() - self._refreshed_at < self.max_age:
+            return self._columns
+        # Another request is refreshing; rather than wait, use SQL this once
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._columns if self._ensure_fresh(db) else None
+        finally:
+            self._lock.release()
+
+    def _ensure_fresh(self, db: Session) -> bool:
+        """Apply pending changes; False if the snapshot isn't up to date yet"""
+        try:
+            if self._columns is None:
+                self._build(db)
+                return True
+
+            version = table_versions(_TABLES)
+            if version == self._version and time.monotonic() - self._refreshed_at < self.max_age:
+                return True
+            if version != self._version and (self._pending is None or self._pending[0] != version):
+                # The write behind this version committed before now
+                self._pending = (version, utcnow())
+
+            horizon = change_horizon(db)
+            changes, token = crud.get_student_changes(db, since=self._token, limit=self.max_changes, horizon=horizon)
+            if len(changes) == self.max_changes:
+                # Too far behind to patch; rebuild from scratch
+                self._build(db)
+                return True
+            if changes:
+                self._apply(changes)
+                self._token = token
+
+            if self._pending is not None and horizon < self._pending[1]:
+                # The feed still holds back writes this version counts
+                return False
+            self._pending = None
+            self._version = version
+            self._refreshed_at = time.monotonic()
+            return True
+        except Exception:
+            self._columns = None
+            self._version = ()
+            return False
+
+    def _build(self, db: Session) -> None:
+        version = table_versions(_TABLES)
+        # Start following the feed at its horizon: everything older is committed
+        # and loaded below, newer rows are replayed (harmlessly, if already loaded)
+        token = encode_change_token(change_horizon(db), 0)
+
+        ids, room_ids, birthdays, sex, names = [], [], [], [], []
+        rows = db.execute(
+            select(Student.student_id, Student.name, Student.birthday, Student.sex, Student.room_id)
+            .where(Student.deleted_at.is_(None))
+            .order_by(Student.student_id)
+            .execution_options(yield_per=10000)
+        )
+        for student_id, name, birthday, student_sex, student_room_id in rows:
+            ids.append(student_id)
+            names.append(name)
+            birthdays.append(birthday.toordinal())
+            sex.append(SEX_CODES[student_sex.value])
+            room_ids.append(NO_ROOM if student_room_id is None else student_room_id)
+
+        self._columns = _Columns(
+            np.array(ids, dtype=np.int64),
+            np.array(room_ids, dtype=np.int64),
+            np.array(birthdays, dtype=np.int32),
+            np.array(sex, dtype=np.int8),
+            names
+        )
+        self._token = token
+        self._pending = None
+        self._version = version
+        self._refreshed_at = time.monotonic()
+
+    def _apply(self, changes: list) -> None:
+        """Merge a batch of upserts, tombstones and archived students into new arrays"""
+        current = self._columns
+        changed_ids = np.array([student.student_id for student in changes], dtype=np.int64)
+        keep = ~np.isin(current.ids, changed_ids)
+        live = [student for student in changes if not student.deleted]
+
+        names = [n for n, k in zip(current.names, keep) if k]
+        names.extend(student.name for student in live)
+
+        ids = np.concatenate([current.ids[keep], [s.student_id for s in live]]).astype(np.int64)
+        order = np.argsort(ids, kind="stable")
+        self._columns = _Columns(
+            ids[order],
+            np.concatenate([
+                current.room_ids[keep],
+                [NO_ROOM if s.room_id is None else s.room_id for s in live]
+            ]).astype(np.int64)[order],
+            np.concatenate([current.birthdays[keep], [s.birthday.toordinal() for s in live]]).astype(np.int32)[order],
+            np.concatenate([current.sex[keep], [SEX_CODES[s.sex.value] for s in live]]).astype(np.int8)[order],
+            [names[i] for i in order]
+        )
+
+
+def _row(columns: _Columns, i: int) -> dict:
+    room_id = int(columns.room_ids[i])
+    return {
+        "student_id": int(columns.ids[i]),
+        "name": columns.names[i],
+        "birthday": date.fromordinal(int(columns.birthdays[i])),
+        "sex": SEX_VALUES[columns.sex[i]],
+        "room_id": None if room_id == NO_ROOM else room_id
+    }
+
+
+student_snapshot = StudentSnapshot()
@@ -0,0 +1,246 @@
+"""
+Event-loop lag watchdog
+
+The route handlers are `async def` but call blocking database code, so a slow
+query stalls every other request on the loop. The watchdog measures that:
+
+- A heartbeat task sleeps WATCHDOG_INTERVAL_MS at a time and records how late
+  it wakes up, as a lag histogram exported on /metrics.
+- A monitor thread notices when the heartbeat is overdue by more than
+  WATCHDOG_BLOCK_MS, snapshots the event-loop thread's stack and logs it with
+  the request route and the app/cruds function that is running.
+- With WATCHDOG_RAISE_MS set (debug/test mode), a request whose handler
+  blocked the loop longer than that raises BlockingCallError once it
+  finishes, so a test client call fails instead of passing slowly.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import deque
+from typing import Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "true").lower() == "true"
+WATCHDOG_INTERVAL_MS = float(os.getenv("WATCHDOG_INTERVAL_MS", "50"))
+WATCHDOG_BLOCK_MS = float(os.getenv("WATCHDOG_BLOCK_MS", "100"))
+WATCHDOG_RAISE_MS = float(os.getenv("WATCHDOG_RAISE_MS", "0")) or None
+
+# Upper bounds (ms) of the lag histogram buckets; the last bucket is +Inf
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_APP_DIR = os.sep + os.path.join("app", "")
+_CRUDS_DIR = os.sep + os.path.join("app", "cruds", "")
+_ROUTERS_DIR = os.sep + os.path.join("app", "routers", "")
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingCallError(Exception):
+    """Raised in debug mode when a handler blocked the event loop for too long"""
+
+
+class LoopWatchdog:
+    """Heartbeat task plus monitor thread watching one event loop"""
+
+    def __init__(
+            self,
+            interval: float = WATCHDOG_INTERVAL_MS / 1000,
+            block_threshold: float = WATCHDOG_BLOCK_MS / 1000,
+            raise_threshold: Optional[float] = WATCHDOG_RAISE_MS / 1000 if WATCHDOG_RAISE_MS else None,
+            recent: int = 20
+    ):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.raise_threshold = raise_threshold
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.lag_count = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+        self.blocked = 0
+        self.recent: deque = deque(maxlen=recent)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._beat = 0.0
+        self._stall: Optional[dict] = None
+        # Request scope per task, so a stall can be pinned on the running request
+        self._requests: dict[asyncio.Task, Scope] = {}
+        self._task_stalls: dict[asyncio.Task, list[dict]] = {}
+
+    def start(self) -> None:
+        """Start watching the running loop (call from the loop, e.g. on startup)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = self._loop.create_task(self._run_heartbeat())
+        self._monitor = threading.Thread(target=self._run_monitor, name="loop-watchdog", daemon=True)
+        self._monitor.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeat and monitor"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+    def stats(self) -> dict:
+        """Lag histogram (cumulative, Prometheus style) and recent stalls for the metrics endpoint"""
+        cumulative, running = {}, 0
+        for bound, count in zip((*LAG_BUCKETS_MS, "+Inf"), self.buckets):
+            running += count
+            cumulative[str(bound)] = running
+        return {
+            "running": self._heartbeat is not None,
+            "lag_ms": {
+                "buckets": cumulative,
+                "count": self.lag_count,
+                "sum": round(self.lag_sum * 1000, 3),
+                "max": round(self.lag_max * 1000, 3)
+            },
+            "blocked": self.blocked,
+            "recent": [
+                {key: value for key, value in stall.items() if not key.startswith("_")}
+                for stall in self.recent
+            ]
+        }
+
+    def track(self, scope: Scope) -> Optional[asyncio.Task]:
+        """Associate the current task with a request"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._requests[task] = scope
+        return task
+
+    def untrack(self, task: Optional[asyncio.Task]) -> Optional[dict]:
+        """Forget a request's task; returns its longest stall, if any"""
+        if task is None:
+            return None
+        self._requests.pop(task, None)
+        stalls = self._task_stalls.pop(task, None)
+        return max(stalls, key=lambda stall: stall["blocked_ms"]) if stalls else None
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            self._observe(max(now - started - self.interval, 0.0))
+
+    def _observe(self, lag: float) -> None:
+        self.buckets[bisect_left(LAG_BUCKETS_MS, lag * 1000)] += 1
+        self.lag_count += 1
+        self.lag_sum += lag
+        self.lag_max = max(self.lag_max, lag)
+        stall = self._stall
+        if stall is not None:
+            # The heartbeat's own lag is more precise than the monitor's last poll
+            stall["blocked_ms"] = max(stall["blocked_ms"], round(lag * 1000, 1))
+
+    def _run_monitor(self) -> None:
+        # In debug mode stalls shorter than the logging threshold still count against requests
+        threshold = min(self.block_threshold, self.raise_threshold or self.block_threshold)
+        poll = min(self.interval, threshold) / 2
+        while not self._stop.wait(poll):
+            overdue = time.monotonic() - self._beat - self.interval
+            stall = self._stall
+            if overdue < threshold:
+                if stall is not None:
+                    self._stall = None
+                    logger.warning(
+                        "Event loop blocked for %.0f ms in %s (%s)\n%s",
+                        stall["blocked_ms"], stall["route"], stall["crud"], "".join(stall.pop("_stack"))
+                    )
+                continue
+
+            if stall is None:
+                self._stall = stall = self._capture()
+                self.blocked += 1
+                self.recent.append(stall)
+            stall["blocked_ms"] = round(overdue * 1000, 1)
+
+    def _capture(self) -> dict:
+        """Describe what the loop thread is doing right now"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.extract_stack(frame) if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        scope = self._requests.get(task) if task is not None else None
+
+        stall = {
+            "at": time.time(),
+            "blocked_ms": 0.0,
+            "route": _route_name(scope) if scope else _innermost(stack, _ROUTERS_DIR),
+            "crud": _innermost(stack, _CRUDS_DIR),
+            "frames": [f"{f.name} ({_short(f.filename)}:{f.lineno})" for f in stack if _is_app(f.filename)],
+            "_stack": traceback.format_list(stack)
+        }
+        if task is not None and scope is not None:
+            self._task_stalls.setdefault(task, []).append(stall)
+        return stall
+
+
+def _route_name(scope: Scope) -> str:
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', scope.get('path', ''))}".strip()
+
+
+def _innermost(stack: list, directory: str) -> Optional[str]:
+    """Qualified name of the innermost stack frame in the given app directory"""
+    for frame in reversed(stack):
+        if directory in frame.filename:
+            module = _short(frame.filename)[:-len(".py")].replace(os.sep, ".")
+            return f"{module}.{frame.name}"
+    return None
+
+
+def _is_app(filename: str) -> bool:
+    return _APP_DIR in filename and "site-packages" not in filename
+
+
+def _short(filename: str) -> str:
+    """Path from the app package on, e.g. app/cruds/student.py"""
+    index = filename.rfind(_APP_DIR)
+    return filename[index + 1:] if index != -1 else filename
+
+
+class WatchdogMiddleware:
+    """Pure ASGI middleware tying requests to their tasks (and enforcing the debug limit)"""
+
+    def __init__(self, app: ASGIApp, watchdog: Optional[LoopWatchdog] = None):
+        self.app = app
+        self.watchdog = watchdog or loop_watchdog
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.watchdog._heartbeat is None:
+            await self.app(scope, receive, send)
+            return
+
+        task = self.watchdog.track(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stall = self.watchdog.untrack(task)
+
+        limit = self.watchdog.raise_threshold
+        if stall is not None and limit is not None and stall["blocked_ms"] > limit * 1000:
+            raise BlockingCallError(
+                f"{stall['route']} blocked the event loop for {stall['blocked_ms']:.0f} ms "
+                f"(limit {limit * 1000:.0f} ms) in {stall['crud'] or 'non-crud code'}"
+            )
+
+
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,83 @@
+"""
+CRUD statement micro-benchmark
+
+Times a loop of get_students + count_students_filtered + get_student +
+room_exists against a throwaway SQLite database and reports CPU time per
+iteration (time.process_time), so statement construction and SQL
+compilation show up rather than I/O. Run it on a commit and its parent to
+compare query-building changes:
+
+    python benchmarks/crud_statements.py --iterations 2000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="crud-bench-"), "bench.db")
+os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+import app.cruds as crud  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Room, Student  # noqa: E402
+from app.schemas import SexEnum  # noqa: E402
+
+engine.echo = False
+
+
+def seed(students: int, rooms: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    with SessionLocal() as db:
+        db.add_all(Room(room_id=room_id, name=f"Room #{room_id}") for room_id in range(1, rooms + 1))
+        db.add_all(
+            Student(
+                student_id=student_id,
+                name=f"Student {rng.randrange(students):06d}",
+                birthday=datetime.date(1990, 1, 1) + datetime.timedelta(days=rng.randrange(7300)),
+                sex=rng.choice(list(SexEnum)),
+                room_id=rng.randrange(1, rooms + 1)
+            )
+            for student_id in range(1, students + 1)
+        )
+        db.commit()
+
+
+def run(iterations: int, students: int, rooms: int) -> float:
+    """CPU milliseconds per iteration"""
+    with SessionLocal() as db:
+        def iteration(i: int) -> None:
+            room_id = i % rooms + 1
+            crud.get_students(db, skip=0, limit=20, sex=SexEnum.M, room_id=room_id)
+            crud.count_students_filtered(db, sex=SexEnum.M, room_id=room_id)
+            crud.get_student(db, i % students + 1)
+            crud.room_exists(db, room_id)
+            db.expunge_all()
+
+        # Warm up the statement caches before measuring
+        for i in range(min(iterations, 200)):
+            iteration(i)
+        start = time.process_time()
+        for i in range(iterations):
+            iteration(i)
+        return (time.process_time() - start) * 1000 / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=50)
+    args = parser.parse_args()
+
+    seed(args.students, args.rooms)
+    per_iteration = run(args.iterations, args.students, args.rooms)
+    print(f"{args.iterations} iterations: {per_iteration:.3f} ms CPU per iteration")
+
+
+if __name__ == "__main__":
+    main()
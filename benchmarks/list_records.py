@@ -0,0 +1,124 @@
+"""
+List page benchmark: ORM instances against record mode
+
+Loads 100-row pages of get_students, get_rooms and get_students_in_room
+from a throwaway SQLite database, once as ORM instances and once with
+as_records=True, and serializes each page the way the routes do. Reports
+CPU time per page (fetch plus pydantic JSON) and the memory still held
+by a loaded page, traced with tracemalloc:
+
+    python benchmarks/list_records.py --students 20000
+"""
+import argparse
+import datetime
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="records-bench-"), "bench.db")
+os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+import app.cruds as crud  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Room, Student  # noqa: E402
+from app.schemas import PaginatedResponse, RoomResponse, SexEnum, StudentResponse  # noqa: E402
+
+engine.echo = False
+
+PAGE = 100
+
+
+def seed(students: int, rooms: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    with SessionLocal() as db:
+        db.add_all(Room(room_id=room_id, name=f"Room #{room_id}") for room_id in range(1, rooms + 1))
+        db.add_all(
+            Student(
+                student_id=student_id,
+                name=f"Student {rng.randrange(students):06d}",
+                birthday=datetime.date(1990, 1, 1) + datetime.timedelta(days=rng.randrange(7300)),
+                sex=rng.choice(list(SexEnum)),
+                # Room 1 holds a full page of students
+                room_id=1 if student_id <= PAGE else rng.randrange(1, rooms + 1)
+            )
+            for student_id in range(1, students + 1)
+        )
+        db.commit()
+
+
+def listings(students: int, rooms: int):
+    """(name, loader(db, page, as_records), response model) per benchmarked listing"""
+    student_pages = max(students // PAGE, 1)
+    room_pages = max(rooms // PAGE, 1)
+    return [
+        ("get_students", lambda db, page, as_records: crud.get_students(
+            db, skip=page % student_pages * PAGE, limit=PAGE, as_records=as_records
+        ), StudentResponse),
+        ("get_rooms", lambda db, page, as_records: crud.get_rooms(
+            db, skip=page % room_pages * PAGE, limit=PAGE, as_records=as_records
+        ), RoomResponse),
+        ("get_students_in_room", lambda db, page, as_records: crud.get_students_in_room(
+            db, 1, skip=0, limit=PAGE, as_records=as_records
+        ), StudentResponse),
+    ]
+
+
+def cpu_per_page(loader, model, as_records: bool, pages: int) -> float:
+    """CPU milliseconds to fetch and serialize one page"""
+    with SessionLocal() as db:
+        def request(page: int) -> None:
+            rows = loader(db, page, as_records)
+            PaginatedResponse[model](data=rows, total=len(rows), page=1, size=PAGE, pages=1).model_dump_json()
+            db.expunge_all()
+
+        for page in range(min(pages, 50)):
+            request(page)
+        start = time.process_time()
+        for page in range(pages):
+            request(page)
+        return (time.process_time() - start) * 1000 / pages
+
+
+def memory_held(loader, as_records: bool) -> int:
+    """Bytes still allocated while a loaded page is held"""
+    with SessionLocal() as db:
+        loader(db, 0, as_records)
+        db.expunge_all()
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+        rows = loader(db, 0, as_records)
+        held = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename"))
+        tracemalloc.stop()
+        del rows
+        return held
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=1000)
+    args = parser.parse_args()
+
+    seed(args.students, args.rooms)
+    for name, loader, model in listings(args.students, args.rooms):
+        orm_cpu = cpu_per_page(loader, model, False, args.pages)
+        record_cpu = cpu_per_page(loader, model, True, args.pages)
+        orm_held = memory_held(loader, False)
+        record_held = memory_held(loader, True)
+        print(
+            f"{name:22} {orm_cpu:.3f} -> {record_cpu:.3f} ms, "
+            f"{orm_held // 1024:>4} -> {record_held // 1024:>3} KiB held "
+            f"({(record_cpu - orm_cpu) / orm_cpu:+.0%} CPU)"
+        )
+
+
+if __name__ == "__main__":
+    main()
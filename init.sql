@@ -2,7 +2,11 @@ USE student_room_db;
 
 CREATE TABLE IF NOT EXISTS Rooms (
     room_id INT PRIMARY KEY,
-    name VARCHAR(50) NOT NULL
+    name VARCHAR(50) NOT NULL,
+    capacity INT NULL,
+    updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    deleted_at DATETIME(6) NULL,
+    INDEX ix_rooms_updated_at (updated_at, room_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 CREATE TABLE IF NOT EXISTS Students (
@@ -11,9 +15,67 @@ CREATE TABLE IF NOT EXISTS Students (
     birthday DATE NOT NULL,
     sex ENUM('M', 'F') NOT NULL,
     room_id INT,
+    updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    deleted_at DATETIME(6) NULL,
+    graduated_at DATETIME(6) NULL,
+    INDEX ix_students_updated_at (updated_at, student_id),
+    INDEX ix_students_room_id (room_id, student_id),
+    INDEX ix_students_room_id_name (room_id, name),
+    INDEX ix_students_room_id_birthday (room_id, birthday),
+    INDEX ix_students_sex (sex, student_id),
+    INDEX ix_students_sex_name (sex, name, student_id),
+    INDEX ix_students_sex_birthday (sex, birthday),
+    INDEX ix_students_birthday (birthday, student_id),
+    INDEX ix_students_name (name, student_id),
+    INDEX ix_students_graduated_at (graduated_at, student_id),
     FOREIGN KEY (room_id) REFERENCES Rooms(room_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Graduated students moved out of Students; partitioned by birth year so
+-- birthday filters only read the matching partitions
+CREATE TABLE IF NOT EXISTS ArchivedStudents (
+    student_id INT NOT NULL,
+    birthday DATE NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    sex ENUM('M', 'F') NOT NULL,
+    room_id INT NULL,
+    graduated_at DATETIME(6) NOT NULL,
+    archived_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (student_id, birthday),
+    INDEX ix_archived_students_name (name, student_id),
+    INDEX ix_archived_students_room_id (room_id, student_id),
+    INDEX ix_archived_students_archived_at (archived_at, student_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (YEAR(birthday)) (
+    PARTITION p1950 VALUES LESS THAN (1960),
+    PARTITION p1960 VALUES LESS THAN (1970),
+    PARTITION p1970 VALUES LESS THAN (1980),
+    PARTITION p1980 VALUES LESS THAN (1990),
+    PARTITION p1990 VALUES LESS THAN (2000),
+    PARTITION p2000 VALUES LESS THAN (2010),
+    PARTITION p2010 VALUES LESS THAN (2020),
+    PARTITION p2020 VALUES LESS THAN (2030),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+CREATE TABLE IF NOT EXISTS Jobs (
+    job_id VARCHAR(32) PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status ENUM('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', 'CANCELLED') NOT NULL,
+    params JSON NULL,
+    progress FLOAT NOT NULL DEFAULT 0,
+    result JSON NULL,
+    error TEXT NULL,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_jobs_status (status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- The change feed reads information_schema.innodb_trx to hold back changes
+-- of transactions that are still open
+GRANT PROCESS ON *.* TO 'api_user'@'%';
+
 INSERT IGNORE INTO Rooms (room_id, name) VALUES
     (101, 'Computer Science Lab'),
     (102, 'Mathematics Room'),
@@ -0,0 +1,23 @@
+-- Change tracking for delta sync: updated_at/deleted_at on Rooms and Students.
+--
+-- init.sql only runs on an empty data volume and create_all() never alters
+-- existing tables, so databases created before this change need:
+--
+--   mysql -u root -p student_room_db < migrations/001_change_tracking.sql
+--
+-- Existing rows get the migration time as updated_at.
+USE student_room_db;
+
+ALTER TABLE Rooms
+    ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD COLUMN deleted_at DATETIME(6) NULL,
+    ADD INDEX ix_rooms_updated_at (updated_at, room_id);
+
+ALTER TABLE Students
+    ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD COLUMN deleted_at DATETIME(6) NULL,
+    ADD INDEX ix_students_updated_at (updated_at, student_id);
+
+-- The change feed reads information_schema.innodb_trx to hold back changes
+-- of transactions that are still open
+GRANT PROCESS ON *.* TO 'api_user'@'%';
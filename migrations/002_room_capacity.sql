@@ -0,0 +1,7 @@
+-- Room capacity: NULL means no limit.
+--
+--   mysql -u root -p student_room_db < migrations/002_room_capacity.sql
+USE student_room_db;
+
+ALTER TABLE Rooms
+    ADD COLUMN capacity INT NULL AFTER name;
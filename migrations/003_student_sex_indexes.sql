@@ -0,0 +1,9 @@
+-- Indexes that let a sex filter be read in name or student_id order
+-- without a filesort.
+--
+--   mysql -u root -p student_room_db < migrations/003_student_sex_indexes.sql
+USE student_room_db;
+
+ALTER TABLE Students
+    ADD INDEX ix_students_sex (sex, student_id),
+    ADD INDEX ix_students_sex_name (sex, name, student_id);
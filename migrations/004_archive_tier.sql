@@ -0,0 +1,37 @@
+-- Archive tier: graduated_at on Students and the ArchivedStudents table,
+-- whose archived_at index serves archived students to the change feed.
+--
+--   mysql -u root -p student_room_db < migrations/004_archive_tier.sql
+USE student_room_db;
+
+ALTER TABLE Students
+    ADD COLUMN graduated_at DATETIME(6) NULL AFTER deleted_at,
+    ADD INDEX ix_students_graduated_at (graduated_at, student_id);
+
+CREATE TABLE IF NOT EXISTS ArchivedStudents (
+    student_id INT NOT NULL,
+    birthday DATE NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    sex ENUM('M', 'F') NOT NULL,
+    room_id INT NULL,
+    graduated_at DATETIME(6) NOT NULL,
+    archived_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (student_id, birthday),
+    INDEX ix_archived_students_name (name, student_id),
+    INDEX ix_archived_students_room_id (room_id, student_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (YEAR(birthday)) (
+    PARTITION p1950 VALUES LESS THAN (1960),
+    PARTITION p1960 VALUES LESS THAN (1970),
+    PARTITION p1970 VALUES LESS THAN (1980),
+    PARTITION p1980 VALUES LESS THAN (1990),
+    PARTITION p1990 VALUES LESS THAN (2000),
+    PARTITION p2000 VALUES LESS THAN (2010),
+    PARTITION p2010 VALUES LESS THAN (2020),
+    PARTITION p2020 VALUES LESS THAN (2030),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Kept out of CREATE TABLE so it is also added where the table already exists
+ALTER TABLE ArchivedStudents
+    ADD INDEX ix_archived_students_archived_at (archived_at, student_id);
@@ -0,0 +1,13 @@
+-- Indexes behind the room, birthday and name sorts and the birthday range
+-- filters, which init.sql has but earlier migrations never added.
+--
+--   mysql -u root -p student_room_db < migrations/005_student_sort_indexes.sql
+USE student_room_db;
+
+ALTER TABLE Students
+    ADD INDEX ix_students_room_id (room_id, student_id),
+    ADD INDEX ix_students_room_id_name (room_id, name),
+    ADD INDEX ix_students_room_id_birthday (room_id, birthday),
+    ADD INDEX ix_students_sex_birthday (sex, birthday),
+    ADD INDEX ix_students_birthday (birthday, student_id),
+    ADD INDEX ix_students_name (name, student_id);
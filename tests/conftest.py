@@ -0,0 +1,30 @@
+"""
+Shared test setup: the app runs against a throwaway SQLite database
+"""
+import os
+import tempfile
+
+import pytest
+
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="student-room-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ["CHANGE_FEED_LAG_MS"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["WATCHDOG_ENABLED"] = "false"
+
+import app.models  # noqa: E402,F401  (registers the tables)
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+engine.echo = False
+
+
+@pytest.fixture
+def db():
+    """Session on freshly created, empty tables"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
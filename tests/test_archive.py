@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+
+import app.cruds as crud
+from app.schemas import SexEnum, SortOrderEnum, StudentChange, StudentSortEnum
+from app.snapshot import StudentSnapshot, student_snapshot
+
+
+def _add(db, student_id, name, graduated=False):
+    crud.create_student(db, student_id, name, datetime.date(2000, 1, 1), SexEnum.F)
+    if graduated:
+        crud.graduate_student(db, student_id)
+
+
+@pytest.mark.parametrize("order", list(SortOrderEnum))
+def test_active_and_archived_merge_in_one_name_order(db, order):
+    names = ["bob", "Émile", "alice", "Zoe", "Ana", "zed", "éva", "Bob"]
+    for student_id, name in enumerate(names, start=1):
+        _add(db, student_id, name, graduated=student_id % 2 == 0)
+    crud.archive_graduated_students(db)
+
+    merged = crud.get_students_with_archived(db, limit=len(names), sort=StudentSortEnum.NAME, order=order)
+
+    expected = sorted(zip(names, range(1, len(names) + 1)), reverse=order == SortOrderEnum.DESC)
+    assert [(student.name, student.student_id) for student in merged] == expected
+    # Paging through the merge yields the same order
+    pages = [
+        crud.get_students_with_archived(db, skip=skip, limit=3, sort=StudentSortEnum.NAME, order=order)
+        for skip in range(0, len(names), 3)
+    ]
+    assert [student.student_id for page in pages for student in page] == [student_id for _, student_id in expected]
+
+
+def test_change_feed_reports_archived_students_as_removed(db):
+    _add(db, 1, "Stays")
+    _add(db, 2, "Graduates", graduated=True)
+    _, token = crud.get_student_changes(db)
+
+    assert crud.archive_graduated_students(db) == 1
+    changes, next_token = crud.get_student_changes(db, since=token)
+
+    change = StudentChange.model_validate(changes[0])
+    assert [c.student_id for c in changes] == [2]
+    assert change.deleted and change.archived and change.graduated_at is not None
+    assert crud.get_student_changes(db, since=next_token)[0] == []
+
+
+@pytest.mark.skipif(not student_snapshot.available, reason="NumPy is not installed")
+def test_snapshot_follows_archive_runs_through_the_feed(db):
+    _add(db, 1, "Stays")
+    _add(db, 2, "Graduates", graduated=True)
+    snapshot = StudentSnapshot(max_age=0)
+    assert snapshot.query(db)[1] == 2
+
+    crud.archive_graduated_students(db)
+    rebuilds = []
+    snapshot._build = rebuilds.append
+
+    rows, total = snapshot.query(db)
+    assert [row["student_id"] for row in rows] == [1] and total == 1
+    assert rebuilds == []
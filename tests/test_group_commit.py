@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import app.cruds as crud
+from app.autocomplete import name_index
+from app.cache import table_versions
+from app.group_commit import GroupCommit
+from app.schemas import SexEnum
+
+
+def _create(student_id, name):
+    def op(db):
+        return crud.create_student(db, student_id, name, datetime.date(2000, 1, 1), SexEnum.M, commit=False)
+    return op
+
+
+def _fail_after(op):
+    def failing(db):
+        op(db)
+        db.flush()
+        raise ValueError("rejected")
+    return failing
+
+
+@pytest.fixture
+def index(db):
+    name_index.build(db)
+    db.commit()
+    return name_index
+
+
+def test_batch_commits_good_writes_once_and_drops_the_failed_one(db, index):
+    before = table_versions(["Students"])
+    seen_mid_batch = []
+
+    def observe(db):
+        seen_mid_batch.append((table_versions(["Students"]), index.search("alice")))
+        return _create(3, "Carol")(db)
+
+    outcomes = GroupCommit(enabled=True)._commit_batch(
+        [_create(1, "Alice"), _fail_after(_create(2, "Bob")), observe]
+    )
+
+    assert [ok for ok, _ in outcomes] == [True, False, True]
+    # Savepoint releases must not publish anything before the real commit
+    assert seen_mid_batch == [(before, [])]
+    assert table_versions(["Students"]) != before
+    assert index.search("alice") == [(1, "Alice")]
+    assert index.search("carol") == [(3, "Carol")]
+    assert index.search("bob") == []
+    assert [student.student_id for student in crud.get_students(db)] == [1, 3]
+
+
+def test_failed_commit_publishes_nothing(db, index):
+    before = table_versions(["Students"])
+
+    def fail_commit(session):
+        if not session.in_nested_transaction():
+            raise OperationalError("COMMIT", {}, Exception("disk I/O error"))
+
+    event.listen(Session, "before_commit", fail_commit)
+    try:
+        outcomes = GroupCommit(enabled=True)._commit_batch([_create(1, "Alice"), _create(2, "Bob")])
+    finally:
+        event.remove(Session, "before_commit", fail_commit)
+
+    assert [ok for ok, _ in outcomes] == [False, False]
+    assert table_versions(["Students"]) == before
+    assert index.search("alice") == []
+    assert crud.get_students(db) == []
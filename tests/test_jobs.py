@@ -0,0 +1,58 @@
+import threading
+import uuid
+from datetime import timedelta
+
+from app.jobs import JOB_LEASE_SECONDS, JobRunner, job_handler
+from app.models import Job, JobStatusEnum, utcnow
+
+runs = []
+
+
+@job_handler("test_record")
+def _record_job(db, params, ctx):
+    runs.append(params["n"])
+    return {"n": params["n"]}
+
+
+def _add_job(db, status, age=0.0, n=0):
+    job = Job(
+        job_id=uuid.uuid4().hex, kind="test_record", params={"n": n}, status=status,
+        updated_at=utcnow() - timedelta(seconds=age)
+    )
+    db.add(job)
+    db.commit()
+    return job.job_id
+
+
+def test_job_is_claimed_by_one_worker_only(db):
+    runs.clear()
+    job_id = _add_job(db, JobStatusEnum.QUEUED, n=1)
+    workers = [JobRunner(), JobRunner()]
+
+    threads = [threading.Thread(target=worker._execute, args=(job_id,)) for worker in workers * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert runs == [1]
+    db.expire_all()
+    assert db.get(Job, job_id).status == JobStatusEnum.SUCCEEDED
+
+
+def test_only_jobs_with_expired_leases_are_recovered(db):
+    runs.clear()
+    live = _add_job(db, JobStatusEnum.RUNNING, age=1, n=1)
+    abandoned = _add_job(db, JobStatusEnum.RUNNING, age=JOB_LEASE_SECONDS + 60, n=2)
+    queued = _add_job(db, JobStatusEnum.QUEUED, n=3)
+
+    runner = JobRunner(workers=1)
+    runner.start()
+    runner._executor.shutdown(wait=True)
+    runner.shutdown()
+
+    db.expire_all()
+    assert db.get(Job, live).status == JobStatusEnum.RUNNING
+    assert db.get(Job, abandoned).status == JobStatusEnum.SUCCEEDED
+    assert db.get(Job, queued).status == JobStatusEnum.SUCCEEDED
+    assert sorted(runs) == [2, 3]
@@ -0,0 +1,50 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+import app.cache
+import app.cruds as crud
+from app.cache import query_cache
+from app.database import SessionLocal
+from app.schemas import SexEnum
+
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    monkeypatch.setattr(app.cache, "QUERY_CACHE_ENABLED", True)
+    query_cache.clear()
+    yield query_cache
+    query_cache.clear()
+
+
+def _add_student(student_id):
+    with SessionLocal() as other:
+        crud.create_student(other, student_id, f"Student {student_id}", datetime.date(2000, 1, 1), SexEnum.M)
+
+
+def test_result_read_in_an_open_transaction_keeps_its_begin_versions(db, cache):
+    _add_student(1)
+    db.execute(select(1))
+    # Committed after this transaction began, so a REPEATABLE READ snapshot
+    # could miss it
+    _add_student(2)
+
+    crud.get_students(db)
+    db.rollback()
+
+    misses = cache.misses
+    assert [student.student_id for student in crud.get_students(db)] == [1, 2]
+    assert cache.misses == misses + 1
+
+
+def test_renaming_a_room_invalidates_students_with_rooms(db, cache):
+    crud.create_room(db, 1, "Old name")
+    crud.create_student(db, 1, "Student 1", datetime.date(2000, 1, 1), SexEnum.M, 1)
+    assert crud.get_students(db, include_room=True)[0].room.name == "Old name"
+    db.close()
+
+    with SessionLocal() as other:
+        crud.update_room(other, 1, "New name")
+
+    assert crud.get_students(db, include_room=True)[0].room.name == "New name"
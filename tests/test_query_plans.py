@@ -0,0 +1,82 @@
+import datetime
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+import app.cruds as crud
+from app.database import engine
+from app.schemas import SexEnum, SortOrderEnum, StudentSortEnum
+
+RANGE = {"born_after": datetime.date(1990, 1, 1), "born_before": datetime.date(2000, 1, 1)}
+
+# Filters whose rows some index returns in the order of every sort
+ORDERED_FILTERS = {
+    "none": {},
+    "name": {"name": "a"},
+    "sex": {"sex": SexEnum.M},
+    "room": {"room_id": 1},
+    "has_room": {"has_room": True},
+    "no_room": {"has_room": False},
+    "sex+room": {"sex": SexEnum.F, "room_id": 1},
+    "sex+name": {"sex": SexEnum.F, "name": "a"},
+    "born_after": {"born_after": RANGE["born_after"]},
+    "born_before": {"born_before": RANGE["born_before"]},
+}
+
+# Filters with a birthday range: in index order only when sorted by birthday
+RANGE_FILTERS = {
+    "born_range": RANGE,
+    "sex+born": {"sex": SexEnum.F, "born_after": RANGE["born_after"]},
+    "room+born": {"room_id": 1, "born_after": RANGE["born_after"]},
+}
+
+
+def _plan(db, **filters) -> list[str]:
+    """EXPLAIN QUERY PLAN details of the query get_students issues"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        crud.get_students(db, limit=10, **filters)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    raw = engine.raw_connection()
+    try:
+        return [row[-1] for row in raw.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+    finally:
+        raw.close()
+
+
+@pytest.mark.parametrize(
+    "filters, sort, order",
+    [
+        pytest.param(filters, sort, order, id=f"{name}-{sort.value}-{order.value}")
+        for (name, filters), sort, order in itertools.product(ORDERED_FILTERS.items(), StudentSortEnum, SortOrderEnum)
+    ] + [
+        pytest.param(filters, StudentSortEnum.BIRTHDAY, order, id=f"{name}-birthday-{order.value}")
+        for (name, filters), order in itertools.product(RANGE_FILTERS.items(), SortOrderEnum)
+    ]
+)
+def test_supported_pairs_read_in_index_order(db, filters, sort, order):
+    plan = _plan(db, sort=sort, order=order, **filters)
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize(
+    "filters, sort",
+    [
+        pytest.param(filters, sort, id=f"{name}-{sort.value}")
+        for (name, filters), sort in itertools.product(RANGE_FILTERS.items(), StudentSortEnum)
+        if sort != StudentSortEnum.BIRTHDAY
+    ]
+)
+def test_range_under_other_sort_searches_before_sorting(db, filters, sort):
+    plan = _plan(db, sort=sort, order=SortOrderEnum.ASC, **filters)
+    assert any(step.startswith("SEARCH") and "birthday" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.cruds as crud
+from app.main import app
+from app.exceptions import RoomCapacityTooSmallError, RoomFullError
+from app.schemas import SexEnum
+
+
+def _fill(db, room_id, count):
+    for student_id in range(1, count + 1):
+        crud.create_student(db, student_id, f"Student {student_id}", datetime.date(2000, 1, 1), SexEnum.M, room_id)
+
+
+def test_room_capacity_is_enforced_on_assignment(db):
+    crud.create_room(db, 1, "Room", capacity=2)
+    _fill(db, 1, 2)
+
+    with pytest.raises(RoomFullError):
+        crud.create_student(db, 3, "One too many", datetime.date(2000, 1, 1), SexEnum.F, 1)
+
+
+def test_capacity_cannot_drop_below_occupancy(db):
+    crud.create_room(db, 1, "Room", capacity=5)
+    _fill(db, 1, 3)
+
+    with pytest.raises(RoomCapacityTooSmallError):
+        crud.update_room(db, 1, "Room", capacity=2)
+    db.rollback()
+
+    assert crud.update_room(db, 1, "Smaller room", capacity=3).capacity == 3
+    assert crud.get_room(db, 1).name == "Smaller room"
+
+
+def test_capacity_is_kept_when_omitted_and_cleared_with_none(db):
+    crud.create_room(db, 1, "Room", capacity=2)
+
+    assert crud.update_room(db, 1, "Renamed").capacity == 2
+    assert crud.update_room(db, 1, "Renamed", capacity=None).capacity is None
+
+
+def test_room_update_route_tells_omitted_from_null_capacity(db):
+    crud.create_room(db, 1, "Room", capacity=2)
+    client = TestClient(app)
+
+    assert client.put("/api/v1/rooms/1", json={"name": "Renamed"}).json()["capacity"] == 2
+    assert client.put("/api/v1/rooms/1", json={"name": "Renamed", "capacity": None}).json()["capacity"] is None
@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+
+import app.cruds as crud
+from app.database import Base, ShardRouter
+from app.schemas import SexEnum, SortOrderEnum, StudentSortEnum
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    """Two SQLite shards; room N lives on shard N % 2"""
+    router = ShardRouter([f"sqlite:///{tmp_path / 'shard0.db'}", f"sqlite:///{tmp_path / 'shard1.db'}"],
+                         fan_out_workers=4)
+    for shard_engine in router.engines.values():
+        shard_engine.echo = False
+        Base.metadata.create_all(bind=shard_engine)
+    for module in ("app.database", "app.cruds.base", "app.cruds.room", "app.cruds.student"):
+        monkeypatch.setattr(f"{module}.shard_router", router)
+    yield router
+    router._executor.shutdown()
+    for shard_engine in router.engines.values():
+        shard_engine.dispose()
+
+
+@pytest.fixture
+def sharded_db(router):
+    session = sessionmaker(
+        class_=ShardedSession,
+        autoflush=False,
+        shards=router.engines,
+        shard_chooser=router.choose_shard,
+        identity_chooser=router.choose_identity,
+        execute_chooser=router.choose_execute
+    )()
+    crud.create_room(session, 1, "Odd room")
+    crud.create_room(session, 2, "Even room")
+    yield session
+    session.close()
+
+
+def _rows(router, shard_id, sql):
+    with router.engines[shard_id].connect() as conn:
+        return [tuple(row) for row in conn.execute(text(sql))]
+
+
+def _add(db, student_id, name="Student", room_id=None):
+    return crud.create_student(db, student_id, name, datetime.date(2000, 1, 1), SexEnum.F, room_id)
+
+
+def test_rooms_and_students_are_placed_by_the_router(router, sharded_db):
+    _add(sharded_db, 1, room_id=2)
+    _add(sharded_db, 3, room_id=2)
+    _add(sharded_db, 5)
+    _add(sharded_db, 6)
+
+    assert _rows(router, "0", "SELECT room_id FROM Rooms") == [(2,)]
+    assert _rows(router, "1", "SELECT room_id FROM Rooms") == [(1,)]
+    # Assigned students follow their room, unassigned ones their own ID
+    assert _rows(router, "0", "SELECT student_id FROM Students ORDER BY student_id") == [(1,), (3,), (6,)]
+    assert _rows(router, "1", "SELECT student_id FROM Students ORDER BY student_id") == [(5,)]
+    assert crud.count_students(sharded_db) == 4
+    assert [student.student_id for student in crud.get_students_in_room(sharded_db, 2)] == [1, 3]
+
+
+def test_move_to_a_room_on_another_shard_relocates_the_student(router, sharded_db):
+    _add(sharded_db, 1, "Mover", room_id=2)
+    graduated_at = crud.graduate_student(sharded_db, 1).graduated_at
+
+    moved = crud.move_student(sharded_db, 1, 1)
+
+    assert moved.room_id == 1 and moved.graduated_at == graduated_at
+    assert _rows(router, "0", "SELECT student_id FROM Students") == []
+    assert _rows(router, "1", "SELECT student_id, room_id FROM Students") == [(1, 1)]
+    sharded_db.expire_all()
+    assert crud.get_student(sharded_db, 1).name == "Mover"
+    assert [student.student_id for student in crud.get_students_in_room(sharded_db, 1)] == [1]
+
+
+@pytest.mark.parametrize("order", list(SortOrderEnum))
+def test_pages_merge_across_shards_in_name_order(sharded_db, order):
+    names = ["bob", "Émile", "alice", "Zoe", "Ana", "zed", "éva", "Bob"]
+    for student_id, name in enumerate(names, start=1):
+        _add(sharded_db, student_id, name, room_id=student_id % 2 + 1)
+
+    # Sharded reads order names by code point so pages merge consistently
+    expected = [student_id for _, student_id in
+                sorted(zip(names, range(1, len(names) + 1)), reverse=order == SortOrderEnum.DESC)]
+    merged = crud.get_students(sharded_db, limit=len(names), sort=StudentSortEnum.NAME, order=order)
+    assert [student.student_id for student in merged] == expected
+
+    pages = [
+        crud.get_students(sharded_db, skip=skip, limit=3, sort=StudentSortEnum.NAME, order=order)
+        for skip in range(0, len(names), 3)
+    ]
+    assert [student.student_id for page in pages for student in page] == expected
+    assert crud.count_students_filtered(sharded_db) == len(names)
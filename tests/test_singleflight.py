@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+import app.singleflight as singleflight_module
+from app.schemas import PaginatedResponse
+from app.singleflight import SingleFlight, coalesced_json
+
+
+def test_concurrent_callers_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def query():
+            calls.append(1)
+            release.wait(5)
+            return 42
+
+        callers = [asyncio.ensure_future(flight.do("key", query)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        assert await asyncio.gather(*callers) == [42, 42, 42]
+        assert len(calls) == 1
+        assert flight.collapsed == 2
+
+    asyncio.run(scenario())
+
+
+def test_follower_gets_result_when_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def query():
+            release.wait(5)
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("key", query))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flight.do("key", query))
+        await asyncio.sleep(0.05)
+
+        leader.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+
+        assert await follower == 42
+        assert leader.cancelled()
+        assert flight.executed == 1
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def query():
+            release.wait(5)
+            raise ValueError("boom")
+
+        callers = [asyncio.ensure_future(flight.do("key", query)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        release.set()
+        for caller in callers:
+            with pytest.raises(ValueError):
+                await caller
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_coalesced_build_owns_its_session(monkeypatch):
+    events = []
+
+    class FakeSession:
+        def close(self):
+            events.append("closed")
+
+    monkeypatch.setattr(singleflight_module, "SessionLocal", FakeSession)
+
+    async def scenario():
+        release = threading.Event()
+
+        def build(db):
+            release.wait(5)
+            events.append(("built", type(db)))
+            return PaginatedResponse[int](data=[1], total=1, page=1, size=1, pages=1)
+
+        leader = asyncio.ensure_future(coalesced_json(("test", 1), build))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(coalesced_json(("test", 1), build))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        release.set()
+
+        response = await follower
+        assert b'"data":[1]' in response.body
+        # The session outlives the cancelled leader and closes after the build
+        assert events == [("built", FakeSession), "closed"]
+
+    asyncio.run(scenario())
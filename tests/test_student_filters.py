@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+
+import app.cruds as crud
+from app.schemas import SexEnum, SortOrderEnum, StudentSortEnum
+from app.snapshot import StudentSnapshot, np
+
+NAMES = ["Anna_Lee", "Annabel", "Bob 100%", "Bob 1000", "Straße", "Élise", "c/d"]
+
+
+@pytest.fixture
+def students(db):
+    for student_id, name in enumerate(NAMES, start=1):
+        crud.create_student(
+            db, student_id, name, datetime.date(1995 + student_id, 1, 1), SexEnum.M if student_id % 2 else SexEnum.F
+        )
+    return db
+
+
+def _names(db, **filters):
+    return [student.name for student in crud.get_students(db, limit=100, **filters)]
+
+
+@pytest.mark.parametrize("needle, expected", [
+    ("_", ["Anna_Lee"]),
+    ("a_", ["Anna_Lee"]),
+    ("%", ["Bob 100%"]),
+    ("0%", ["Bob 100%"]),
+    ("/", ["c/d"]),
+    ("anna", ["Anna_Lee", "Annabel"]),
+])
+def test_name_filter_matches_wildcards_literally(students, needle, expected):
+    assert _names(students, name=needle) == expected
+    assert crud.count_students_filtered(students, name=needle) == len(expected)
+
+
+@pytest.mark.skipif(np is None, reason="the snapshot needs NumPy")
+def test_snapshot_leaves_name_filters_to_sql(students):
+    snapshot = StudentSnapshot()
+    assert snapshot.query(students, name="ss") is None
+
+
+@pytest.mark.skipif(np is None, reason="the snapshot needs NumPy")
+@pytest.mark.parametrize("filters", [
+    {},
+    {"sex": SexEnum.F},
+    {"born_after": datetime.date(1999, 1, 1), "sort": StudentSortEnum.BIRTHDAY, "order": SortOrderEnum.DESC},
+    {"has_room": False, "skip": 2, "limit": 3},
+])
+def test_snapshot_agrees_with_sql(students, filters):
+    snapshot = StudentSnapshot()
+    rows, total = snapshot.query(students, **{"limit": 100, **filters})
+    expected = crud.get_students(students, **{"limit": 100, **filters})
+    assert [row["student_id"] for row in rows] == [student.student_id for student in expected]
+    count_filters = {key: value for key, value in filters.items() if key not in ("skip", "limit", "sort", "order")}
+    assert total == crud.count_students_filtered(students, **count_filters)
+
+
+@pytest.mark.skipif(np is None, reason="the snapshot needs NumPy")
+def test_snapshot_defers_to_sql_until_the_feed_covers_a_write(students, monkeypatch):
+    snapshot = StudentSnapshot(max_age=60)
+    assert snapshot.query(students)[1] == len(NAMES)
+    crud.create_student(students, 100, "Late", datetime.date(2000, 1, 1), SexEnum.F)
+
+    # The feed can't hand out the new row yet, so the snapshot must not claim to be current
+    monkeypatch.setattr("app.cruds.base.CHANGE_FEED_LAG", datetime.timedelta(hours=1))
+    assert snapshot.query(students) is None
+    assert snapshot.query(students) is None
+
+    monkeypatch.setattr("app.cruds.base.CHANGE_FEED_LAG", datetime.timedelta(0))
+    rows, total = snapshot.query(students, limit=100)
+    assert total == len(NAMES) + 1 and rows[-1]["student_id"] == 100
+
+
+@pytest.mark.skipif(np is None, reason="the snapshot needs NumPy")
+def test_fresh_snapshot_serves_while_a_refresh_holds_the_lock(students):
+    snapshot = StudentSnapshot(max_age=60)
+    snapshot.build(students)
+
+    with snapshot._lock:
+        assert snapshot.query(students)[1] == len(NAMES)
+        crud.create_student(students, 100, "Late", datetime.date(2000, 1, 1), SexEnum.F)
+        # Stale now, and the refresh is taken: fall back rather than wait
+        assert snapshot.query(students) is None
+    assert snapshot.query(students)[1] == len(NAMES) + 1
@@ -0,0 +1,42 @@
+import datetime
+
+import pytest
+
+import app.cruds as crud
+from app.exceptions import RoomFullError
+from app.schemas import SexEnum, StudentCreate
+
+
+def _roster(*assignments):
+    return [
+        StudentCreate(student_id=student_id, name=f"Student {student_id}",
+                      birthday=datetime.date(2000, 1, 1), sex=SexEnum.M, room_id=room_id)
+        for student_id, room_id in assignments
+    ]
+
+
+def test_sync_rejects_roster_over_room_capacity(db):
+    crud.create_room(db, 1, "Room", capacity=2)
+    crud.create_student(db, 1, "Student 1", datetime.date(2000, 1, 1), SexEnum.M, 1)
+
+    sync = crud.StudentSync(db)
+    with pytest.raises(RoomFullError):
+        sync.apply(_roster((1, 1), (2, 1), (3, 1)))
+    db.rollback()
+
+    assert crud.count_students_filtered(db) == 1
+
+
+def test_sync_counts_capacity_against_the_roster(db):
+    crud.create_room(db, 1, "Room", capacity=2)
+    crud.create_room(db, 2, "Other room", capacity=2)
+    crud.create_student(db, 1, "Student 1", datetime.date(2000, 1, 1), SexEnum.M, 1)
+    crud.create_student(db, 2, "Student 2", datetime.date(2000, 1, 1), SexEnum.M, 1)
+
+    # Both current occupants move out, so two newcomers fit
+    sync = crud.StudentSync(db)
+    sync.apply(_roster((1, 2), (2, 2)))
+    sync.apply(_roster((3, 1), (4, 1)))
+    assert sync.finish()["inserted"] == 2
+
+    assert [student.student_id for student in crud.get_students_in_room(db, 1)] == [3, 4]